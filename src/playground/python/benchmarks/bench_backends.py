@@ -0,0 +1,66 @@
+import argparse, statistics, sys, time
+from pathlib import Path
+from tabulate import tabulate
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from shared.search import get_embedding, search_documents
+from shared.local_search import get_local_index
+from bench_retrieval import QUERIES
+
+def get_args():
+   parser = argparse.ArgumentParser(description="Compare query latency and result overlap of the local backend with the Azure AI Search service.")
+   parser.add_argument("--repeat", type=int, default=3, help="Passes over the queries per backend")
+   parser.add_argument("--queries", type=Path, default=None, help="Text file with one query per line")
+   parser.add_argument("--titles-only", action="store_true", help="Use the shallower `documents` depth")
+   parser.add_argument("--local-only", action="store_true", help="Skip the service (no Azure AI Search calls)")
+   return parser.parse_args()
+
+def timed(backend: str, questions: list[str], titles_only: bool, repeat: int) -> tuple[list[float], dict]:
+   timings, results = [], {}
+
+   for _ in range(repeat):
+      for q in questions:
+         start = time.perf_counter()
+         results[q] = search_documents(q, titles_only, backend)
+         timings.append(time.perf_counter() - start)
+
+   return timings, results
+
+def overlap(a: list, b: list, n: int) -> float:
+   """Share of the first `n` chunks of `b` that are also in the first `n` of `a`."""
+   expected = {doc["chunk_id"] for doc in b[:n]}
+   return len({doc["chunk_id"] for doc in a[:n]} & expected) / len(expected) if expected else 0.0
+
+if __name__ == "__main__":
+   args = get_args()
+   questions = [q.strip() for q in args.queries.read_text().splitlines() if q.strip()] if args.queries else QUERIES
+
+   # embeddings are cached first so both backends are timed on retrieval alone
+   for q in questions:
+      get_embedding(q)
+
+   start = time.perf_counter()
+   print(f"local index: {get_local_index().stats()}, loaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+   backends = ["local"] if args.local_only else ["local", "azure"]
+   runs = {backend: timed(backend, questions, args.titles_only, args.repeat) for backend in backends}
+   rows = []
+
+   for backend, (timings, results) in runs.items():
+      row = {
+         "backend": backend,
+         "queries": len(timings),
+         "p50 (ms)": round(statistics.median(timings) * 1000, 2),
+         "p95 (ms)": round(statistics.quantiles(timings, n=100)[94] * 1000, 2) if len(timings) > 1 else round(timings[0] * 1000, 2),
+         "results": round(statistics.mean(len(r) for r in results.values()), 1),
+      }
+
+      if "azure" in runs:
+         # the service's hybrid ranking before its semantic reranking, against which the local fusion is compared
+         azure = runs["azure"][1]
+         row["overlap@10"] = round(statistics.mean(overlap(results[q], sorted(azure[q], key=lambda d: d["@search.score"], reverse=True), 10) for q in questions), 3)
+
+      rows.append(row)
+
+   print(tabulate(rows, headers="keys", tablefmt="github"))
@@ -0,0 +1,63 @@
+import argparse, json, resource, subprocess, sys, time
+from pathlib import Path
+from tabulate import tabulate
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "indexer"))
+
+DEFAULT_CORPUS = Path(__file__).resolve().parents[3] / "artifacts" / "hoisington"
+
+def get_args():
+   parser = argparse.ArgumentParser(description="Compare PDF text extraction engines: pages/sec and peak RSS.")
+   parser.add_argument("directory", nargs="?", default=str(DEFAULT_CORPUS), help="Directory of PDFs")
+   parser.add_argument("--engine", help="Run a single engine in this process and print its result as JSON")
+   return parser.parse_args()
+
+def run_engine(engine: str, paths: list[Path]) -> dict:
+   start = time.perf_counter()
+   pages, chars = 0, 0
+
+   if engine == "pypdf":
+      from reader import iter_pdf_pages
+
+      for path in paths:
+         for _, text in iter_pdf_pages(path):
+            pages += 1
+            chars += len(text)
+   else:
+      from reader import loader_for_path
+
+      for path in paths:
+         docs = loader_for_path(path).load()
+         pages += len(docs)
+         chars += len("\n".join((d.page_content or "").strip() for d in docs if d.page_content).strip())
+
+   elapsed = time.perf_counter() - start
+
+   return {
+      "engine": engine,
+      "files": len(paths),
+      "pages": pages,
+      "chars": chars,
+      "seconds": round(elapsed, 2),
+      "pages/sec": round(pages / elapsed, 1),
+      # ru_maxrss is reported in KiB on Linux
+      "peak RSS (MiB)": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+   }
+
+if __name__ == "__main__":
+   args = get_args()
+   paths = sorted(Path(args.directory).glob("*.pdf"))
+
+   if args.engine:
+      print(json.dumps(run_engine(args.engine, paths)))
+      sys.exit(0)
+
+   print(f"benchmarking {len(paths)} PDFs in {args.directory} ...")
+   rows = []
+
+   # each engine runs in a fresh interpreter so import cost and peak RSS are not shared
+   for engine in ("langchain", "pypdf"):
+      out = subprocess.run([sys.executable, __file__, args.directory, "--engine", engine], capture_output=True, text=True, check=True)
+      rows.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+   print(tabulate(rows, headers="keys", tablefmt="github"))
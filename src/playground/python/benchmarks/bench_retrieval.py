@@ -0,0 +1,164 @@
+import argparse, hashlib, os, statistics, sys, tempfile, time
+from pathlib import Path
+from tabulate import tabulate
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "indexer"))
+
+from reader import iter_pdf_pages
+from splitter import split
+
+DEFAULT_CORPUS = Path(__file__).resolve().parents[3] / "artifacts" / "hoisington"
+DEFAULT_VECTORS = Path(__file__).resolve().parents[1] / "shared" / ".cache" / "retrieval"
+
+# questions in the register of the Hoisington quarterly reviews; pass --queries for your own
+QUERIES = [
+   "What is the outlook for long-term Treasury bond yields?",
+   "Why is inflation expected to fall?",
+   "How does the Federal Reserve's monetary policy affect economic growth?",
+   "What is the relationship between debt levels and economic growth?",
+   "How does money velocity affect nominal GDP?",
+   "What happened to real wages and consumer spending?",
+   "Is the economy heading into a recession?",
+   "How do the yield curve and bank lending relate?",
+   "What role does the M2 money supply play in inflation?",
+   "How do government deficits and fiscal policy affect interest rates?",
+   "What are the effects of quantitative tightening?",
+   "How does demographics influence long-term growth?",
+   "What is the impact of a strong dollar on the economy?",
+   "Why did productivity growth slow?",
+   "How do commodity prices feed through to consumer prices?",
+   "What lessons does history offer about disinflation?",
+]
+
+def get_args():
+   parser = argparse.ArgumentParser(description="Measure recall@k, latency and memory of HNSW settings and chunk sizes against exact search, offline.")
+   parser.add_argument("directory", nargs="?", default=str(DEFAULT_CORPUS), help="Directory of PDFs")
+   parser.add_argument("--settings", nargs="*", default=["1200:200", "2000:500", "500:50"], help="max_chars:overlap pairs (indexer/main.py uses 1200:200, the SplitSkill 2000:500)")
+   parser.add_argument("--m", type=int, nargs="*", default=[4, 8, 10], help="HNSW m values (4-10)")
+   parser.add_argument("--ef-construction", type=int, nargs="*", default=[100, 400], help="HNSW efConstruction values (100-1000)")
+   parser.add_argument("--ef-search", type=int, nargs="*", default=[100, 500], help="HNSW efSearch values (100-1000)")
+   parser.add_argument("--k", type=int, default=50, help="Neighbors compared against the exact top-k (shared.search asks for 50)")
+   parser.add_argument("--queries", type=Path, default=None, help="Text file with one query per line")
+   parser.add_argument("--vectors", type=Path, default=DEFAULT_VECTORS, help="Directory the embedded chunks and queries are kept in between runs")
+   parser.add_argument("--output", type=Path, default=None, help="Also write the table to this file")
+   return parser.parse_args()
+
+def embed(texts: list[str], directory: Path) -> np.ndarray:
+   """
+   Embeds `texts` once: the matrix is saved under a hash of the texts and the embedding settings, so later runs
+   (and every HNSW setting in this one) reuse it without calling Azure OpenAI.
+   """
+   from shared.search import embedding_options
+
+   digest = hashlib.sha256(repr(embedding_options()).encode())
+
+   for text in texts:
+      digest.update(hashlib.sha256(text.encode()).digest())
+
+   path = directory / f"{digest.hexdigest()[:16]}.npy"
+
+   if path.exists():
+      return np.load(path)
+
+   from vectorizer import vectorize_in_batch
+
+   vectors = np.asarray(vectorize_in_batch(texts), dtype=np.float32)
+   directory.mkdir(parents=True, exist_ok=True)
+   np.save(path, vectors)
+   return vectors
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+   return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+def exact_top_k(queries: np.ndarray, vectors: np.ndarray, k: int) -> tuple[np.ndarray, list[float]]:
+   """The true nearest chunks by cosine similarity, and how long each query took to answer by brute force."""
+   ids, timings = [], []
+
+   for q in queries:
+      start = time.perf_counter()
+      scores = vectors @ q
+      top = np.argpartition(-scores, k - 1)[:k]
+      ids.append(top[np.argsort(-scores[top])])
+      timings.append(time.perf_counter() - start)
+
+   return np.array(ids), timings
+
+def recall(found: np.ndarray, expected: np.ndarray) -> float:
+   return float(np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, expected)]))
+
+def percentile(values: list[float], p: int) -> float:
+   return statistics.quantiles(values, n=100)[p - 1] if len(values) > 1 else values[0]
+
+def hnsw_rows(vectors: np.ndarray, queries: np.ndarray, expected: np.ndarray, k: int, args) -> list[dict]:
+   try:
+      import hnswlib
+   except ImportError:
+      sys.exit("bench_retrieval needs hnswlib for the HNSW sweep (pip install hnswlib)")
+
+   rows = []
+
+   for m in args.m:
+      for ef_construction in args.ef_construction:
+         # cosine space, like the index's vector profile
+         index = hnswlib.Index(space="cosine", dim=vectors.shape[1])
+         start = time.perf_counter()
+         index.init_index(max_elements=len(vectors), M=m, ef_construction=ef_construction, random_seed=0)
+         index.add_items(vectors, num_threads=1)
+         build_s = time.perf_counter() - start
+
+         with tempfile.TemporaryDirectory() as tmp:
+            index.save_index(os.path.join(tmp, "index.bin"))
+            size_mb = os.path.getsize(os.path.join(tmp, "index.bin")) / 1e6
+
+         for ef_search in args.ef_search:
+            # hnswlib cannot return more neighbors than its candidate list holds
+            index.set_ef(max(ef_search, k))
+            found, timings = [], []
+
+            for q in queries:
+               start = time.perf_counter()
+               labels, _ = index.knn_query(q, k=k, num_threads=1)
+               timings.append(time.perf_counter() - start)
+               found.append(labels[0])
+
+            rows.append({
+               "m": m,
+               "efConstruction": ef_construction,
+               "efSearch": max(ef_search, k),
+               f"recall@{args.k}": round(recall(found, expected), 4),
+               "p50 (ms)": round(statistics.median(timings) * 1000, 3),
+               "p95 (ms)": round(percentile(timings, 95) * 1000, 3),
+               "build (s)": round(build_s, 2),
+               "index (MB)": round(size_mb, 1),
+            })
+
+   return rows
+
+if __name__ == "__main__":
+   args = get_args()
+   texts = ["\n".join(t for _, t in iter_pdf_pages(p) if t) for p in sorted(Path(args.directory).glob("*.pdf"))]
+   questions = [q.strip() for q in args.queries.read_text().splitlines() if q.strip()] if args.queries else QUERIES
+   queries = normalize(embed(questions, args.vectors))
+   print(f"{len(texts)} documents, {len(questions)} queries, k={args.k}")
+
+   rows = []
+
+   for setting in args.settings:
+      max_chars, overlap = (int(v) for v in setting.split(":"))
+      chunks = [c for t in texts for c in split(t, max_chars, overlap)]
+      vectors = normalize(embed(chunks, args.vectors))
+      k = min(args.k, len(chunks))
+
+      expected, timings = exact_top_k(queries, vectors, k)
+      common = {"max_chars:overlap": setting, "chunks": len(chunks)}
+
+      rows.append({**common, "method": "exact", "m": None, "efConstruction": None, "efSearch": None, f"recall@{args.k}": 1.0, "p50 (ms)": round(statistics.median(timings) * 1000, 3), "p95 (ms)": round(percentile(timings, 95) * 1000, 3), "build (s)": None, "index (MB)": round(vectors.nbytes / 1e6, 1)})
+      rows.extend({**common, "method": "hnsw", **row} for row in hnsw_rows(vectors, queries, expected, k, args))
+
+   table = tabulate(rows, headers="keys", tablefmt="github")
+   print(table)
+
+   if args.output:
+      args.output.write_text(table + "\n")
@@ -0,0 +1,60 @@
+import argparse, sys, time
+from pathlib import Path
+from tabulate import tabulate
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "indexer"))
+
+from reader import iter_pdf_pages
+from splitter import get_splitter, split, iter_split
+
+DEFAULT_CORPUS = Path(__file__).resolve().parents[3] / "artifacts" / "hoisington"
+
+def get_args():
+   parser = argparse.ArgumentParser(description="Compare the LangChain splitter with splitter.split on a PDF corpus.")
+   parser.add_argument("directory", nargs="?", default=str(DEFAULT_CORPUS), help="Directory of PDFs")
+   parser.add_argument("--repeat", type=int, default=5, help="Passes over the corpus per splitter")
+   parser.add_argument("--settings", nargs="*", default=["1200:200", "2000:500", "500:50"], help="max_chars:overlap pairs")
+   parser.add_argument("--tokens", action="store_true", help="Also time token-budget mode (needs tiktoken)")
+   return parser.parse_args()
+
+def timed(fn, texts, repeat) -> tuple[float, list[list[str]]]:
+   start = time.perf_counter()
+
+   for _ in range(repeat):
+      chunks = [fn(t) for t in texts]
+
+   return (time.perf_counter() - start) / repeat, chunks
+
+if __name__ == "__main__":
+   args = get_args()
+   texts = ["\n".join(t for _, t in iter_pdf_pages(p) if t) for p in sorted(Path(args.directory).glob("*.pdf"))]
+   mb = sum(len(t) for t in texts) / 1e6
+   print(f"splitting {len(texts)} documents ({mb:.2f}M chars), {args.repeat} passes each ...")
+
+   rows = []
+
+   for setting in args.settings:
+      max_chars, overlap = (int(v) for v in setting.split(":"))
+      langchain_s, expected = timed(get_splitter(max_chars, overlap).split_text, texts, args.repeat)
+      split_s, actual = timed(lambda t: split(t, max_chars, overlap), texts, args.repeat)
+
+      # time to the first chunk is what a streaming caller waits for
+      start = time.perf_counter()
+      next(iter_split(texts[0], max_chars, overlap))
+      first_ms = (time.perf_counter() - start) * 1000
+
+      rows.append({
+         "max_chars:overlap": setting,
+         "chunks": sum(len(c) for c in expected),
+         "identical": expected == actual,
+         "langchain (ms)": round(langchain_s * 1000, 1),
+         "split (ms)": round(split_s * 1000, 1),
+         "speedup": round(langchain_s / split_s, 2),
+         "first chunk (ms)": round(first_ms, 3),
+      })
+
+      if args.tokens:
+         tokens_s, chunks = timed(lambda t: split(t, max_chars // 4, overlap // 4, unit="tokens"), texts, args.repeat)
+         rows.append({"max_chars:overlap": f"{max_chars // 4}:{overlap // 4} tokens", "chunks": sum(len(c) for c in chunks), "split (ms)": round(tokens_s * 1000, 1)})
+
+   print(tabulate(rows, headers="keys", tablefmt="github"))
@@ -0,0 +1,81 @@
+import argparse, json, statistics, subprocess, sys, time
+from pathlib import Path
+from tabulate import tabulate
+
+ROOT = Path(__file__).resolve().parents[1]
+SERVER = ROOT / "mcp" / "server.py"
+
+# each snippet runs in a fresh interpreter and prints how long its imports took, in ms
+IMPORTS = {
+   "shared.search": "import shared.search",
+   "mcp/server.py": f"import importlib.util; spec = importlib.util.spec_from_file_location('server', r'{SERVER}'); spec.loader.exec_module(importlib.util.module_from_spec(spec))",
+}
+
+def get_args():
+   parser = argparse.ArgumentParser(description="Time module imports and MCP server cold start up to its first tool response.")
+   parser.add_argument("--repeat", type=int, default=5, help="Fresh processes per measurement")
+   parser.add_argument("--query", default="inflation", help="Text passed to the `documents` tool")
+   parser.add_argument("--no-call", action="store_true", help="Stop after the MCP handshake (no Azure calls)")
+   return parser.parse_args()
+
+def import_ms(snippet: str) -> float:
+   code = f"import sys, time; sys.path.insert(0, r'{ROOT}'); start = time.perf_counter(); {snippet}; print((time.perf_counter() - start) * 1000)"
+   out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT)
+   return float(out.stdout.strip().splitlines()[-1])
+
+def send(server: subprocess.Popen, message: dict):
+   server.stdin.write(json.dumps(message) + "\n")
+   server.stdin.flush()
+
+def response(server: subprocess.Popen, id: int) -> dict:
+   # the server also prints progress to stdout, so anything that is not our JSON-RPC reply is skipped
+   for line in server.stdout:
+      try:
+         message = json.loads(line)
+      except ValueError:
+         continue
+
+      if isinstance(message, dict) and message.get("id") == id:
+         return message
+
+   raise RuntimeError("server exited before responding")
+
+def cold_start(query: str, call: bool) -> dict:
+   start = time.perf_counter()
+   server = subprocess.Popen([sys.executable, str(SERVER)], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, cwd=ROOT)
+
+   try:
+      send(server, {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {"protocolVersion": "2025-03-26", "capabilities": {}, "clientInfo": {"name": "bench_startup", "version": "1"}}})
+      response(server, 1)
+      timings = {"initialize (ms)": (time.perf_counter() - start) * 1000}
+      send(server, {"jsonrpc": "2.0", "method": "notifications/initialized"})
+
+      if call:
+         send(server, {"jsonrpc": "2.0", "id": 2, "method": "tools/call", "params": {"name": "documents", "arguments": {"text": query}}})
+         reply = response(server, 2)
+
+         if "error" in reply or reply.get("result", {}).get("isError"):
+            raise RuntimeError(f"tool call failed: {reply}")
+
+         timings["first tool response (ms)"] = (time.perf_counter() - start) * 1000
+
+      return timings
+   finally:
+      server.kill()
+      server.wait()
+
+if __name__ == "__main__":
+   args = get_args()
+   rows = []
+
+   for name, snippet in IMPORTS.items():
+      runs = [import_ms(snippet) for _ in range(args.repeat)]
+      rows.append({"measurement": f"import {name}", "median (ms)": round(statistics.median(runs), 1), "min (ms)": round(min(runs), 1)})
+
+   starts = [cold_start(args.query, not args.no_call) for _ in range(args.repeat)]
+
+   for key in starts[0]:
+      runs = [s[key] for s in starts]
+      rows.append({"measurement": f"server {key.split(' (')[0]}", "median (ms)": round(statistics.median(runs), 1), "min (ms)": round(min(runs), 1)})
+
+   print(tabulate(rows, headers="keys", tablefmt="github"))
@@ -0,0 +1,27 @@
+import argparse, sys, time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from shared.search import get_search_client
+from shared.local_search import FIELDS, write_local_index, local_index_path
+
+def get_args():
+   parser = argparse.ArgumentParser(description="Copy the index's chunks and vectors into the local replica queried with SEARCH_BACKEND=local.")
+   parser.add_argument("--directory", type=Path, default=None, help="Where to write the replica (defaults to LOCAL_INDEX_PATH)")
+   args = parser.parse_args()
+   print(args)
+
+   return args
+
+def iter_documents():
+   # the SDK follows the service's continuation pages, which stop at 100,000 documents
+   return get_search_client().search(search_text="*", select=FIELDS + ["text_vector"])
+
+if __name__ == "__main__":
+   args = get_args()
+   directory = args.directory or local_index_path()
+
+   start = time.perf_counter()
+   count = write_local_index(iter_documents(), directory)
+   print(f"exported {count} documents to {directory} in {time.perf_counter() - start:.2f}s")
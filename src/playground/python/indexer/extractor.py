@@ -0,0 +1,165 @@
+import multiprocessing, os, signal, time
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from reader import read, file_parent_id
+from shared.cache import get_text_cache
+
+def default_workers() -> int:
+   return max(1, (os.cpu_count() or 2) - 1)
+
+def register_worker(pids):
+   pids.put(os.getpid())
+
+class WorkerPool:
+   """
+   A process pool whose workers report their pids when they start, so a worker stuck on one file (which
+   cannot be cancelled) can be killed along with the pool.
+   """
+
+   def __init__(self, workers: int):
+      # spawned rather than forked: the pipeline starts pools from its read thread while other threads hold locks
+      # and a SQLite connection, which a forked child would inherit mid-use
+      context = multiprocessing.get_context("spawn")
+      self.pids = context.SimpleQueue()
+      self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=register_worker, initargs=(self.pids,))
+
+   def submit(self, fn, *args) -> Future:
+      return self.executor.submit(fn, *args)
+
+   def terminate(self):
+      while not self.pids.empty():
+         try:
+            os.kill(self.pids.get(), signal.SIGTERM)
+         except OSError:
+            # already exited
+            pass
+
+      self.executor.shutdown(wait=False, cancel_futures=True)
+
+def extract(paths: Iterable[Path], workers: Optional[int] = None, timeout: float = 120, engine: str = "langchain") -> Iterator[Tuple[Path, str]]:
+   """
+   Yields `(path, text)` for `paths`, serving files whose fingerprint (path, size, mtime) and engine are in
+   the text cache without parsing them, and extracting the rest with `read_all`.  Cached text is read one
+   file at a time as it is yielded, so a warm cache does not put the whole corpus in memory.  The cache hit
+   rate is reported once every file has been yielded.
+   """
+   paths = list(paths)
+   cache = get_text_cache()
+
+   if not cache:
+      yield from read_all(paths, workers, timeout, engine)
+      return
+
+   keys = {path: f"{engine}:{file_parent_id(path)}" for path in paths}
+   hits = cache.contains(list(keys.values()))
+   served = 0
+   unread: List[Path] = [p for p in paths if keys[p] not in hits]
+
+   for path in paths:
+      if keys[path] not in hits:
+         continue
+
+      text = cache.lookup([keys[path]]).get(keys[path])
+
+      # evicted by another process since the check
+      if text is None:
+         unread.append(path)
+         continue
+
+      served += 1
+      yield path, text
+
+   for path, text in read_all(unread, workers, timeout, engine):
+      # files with no text are re-read next run rather than cached
+      if text:
+         cache.store(keys[path], text)
+
+      yield path, text
+
+   print(f"text cache: {served} of {len(paths)} files served without parsing ({cache.stats()})")
+
+def read_all(paths: List[Path], workers: Optional[int] = None, timeout: float = 120, engine: str = "langchain") -> Iterator[Tuple[Path, str]]:
+   """
+   Extracts text from `paths` on a process pool and yields `(path, text)` in completion order, so callers
+   can start splitting the first file while the rest are still parsing.  Only `workers` files are in
+   flight at a time.  A file that raises, crashes its worker or runs longer than `timeout` seconds is
+   reported and not yielded, without affecting the others: files caught in a worker crash are retried one at
+   a time to find the one responsible.
+   """
+   workers = workers or default_workers()
+   failed: List[Path] = []
+
+   if workers <= 1:
+      for path in paths:
+         try:
+            text = read(path, engine)
+         except Exception as e:
+            print(f"[WARN] Failed to read {path}: {e}")
+            failed.append(path)
+            continue
+
+         yield path, text
+
+      report(failed)
+      return
+
+   # (path, isolated) popped from the end; isolated files run alone in the pool
+   queue: List[Tuple[Path, bool]] = [(path, False) for path in reversed(paths)]
+   running: Dict[Future, Tuple[Path, float, bool]] = {}
+   pool = WorkerPool(workers)
+
+   try:
+      while queue or running:
+         while queue and len(running) < workers and not any(isolated for _, _, isolated in running.values()):
+            if queue[-1][1] and running:
+               break
+
+            path, isolated = queue.pop()
+            running[pool.submit(read, path, engine)] = (path, time.monotonic(), isolated)
+
+         done, _ = wait(list(running), timeout=1, return_when=FIRST_COMPLETED)
+         restart = False
+
+         for future in done:
+            path, _, isolated = running.pop(future)
+
+            try:
+               text = future.result()
+            except BrokenProcessPool:
+               restart = True
+
+               if isolated:
+                  print(f"[WARN] worker crashed while reading {path}; skipping it")
+                  failed.append(path)
+               else:
+                  queue.append((path, True))
+            except Exception as e:
+               print(f"[WARN] Failed to read {path}: {e}")
+               failed.append(path)
+            else:
+               yield path, text
+
+         for future in [f for f, (_, started, _) in running.items() if time.monotonic() - started > timeout]:
+            path, _, _ = running.pop(future)
+            print(f"[WARN] reading {path} exceeded {timeout}s; skipping it")
+            failed.append(path)
+            restart = True
+
+         if restart:
+            # anything still in flight on the old pool is restarted on a fresh one
+            queue.extend((path, isolated) for path, _, isolated in running.values())
+            running.clear()
+            pool.terminate()
+            pool = WorkerPool(workers)
+   finally:
+      pool.terminate()
+
+   report(failed)
+
+def report(failed: List[Path]):
+   # failed files are not yielded, so they never reach the manifest and are retried next run
+   if failed:
+      print(f"[WARN] {len(failed)} files could not be read: {[p.name for p in failed]}")
@@ -4,12 +4,23 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 from search import upload_directory
+from pipeline import stream_directory
+from reader import ENGINES
+from splitter import UNITS
     
 def get_args():
    parser = argparse.ArgumentParser(description="Ingest files into Azure AI Search.")
    parser.add_argument("directory", help="Path to the directory of files")
    parser.add_argument("max_chars", type=int, nargs="?", default=1200, help="Max characters per chunk")
    parser.add_argument("overlap", type=int, nargs="?", default=200, help="Number of overlapping chars")
+   parser.add_argument("--stream", action="store_true", help="Stream files through read/split/embed/upload stages with bounded memory")
+   parser.add_argument("--unit", choices=UNITS, default="chars", help="Measure max_chars and overlap in characters or in embedding-model tokens")
+   parser.add_argument("--incremental", action="store_true", help="Only index new or modified files and remove chunks of deleted ones, tracked in a local manifest")
+   parser.add_argument("--manifest", type=Path, default=None, help="Manifest file used by --incremental (defaults to shared/.cache/<index>-manifest.json)")
+   parser.add_argument("--workers", type=int, default=None, help="Processes used to extract text from files (defaults to CPU count - 1; 1 extracts in-process)")
+   parser.add_argument("--timeout", type=float, default=120, help="Seconds allowed to extract a single file before it is skipped")
+   parser.add_argument("--reader", choices=ENGINES, default="langchain", help="Text extraction engine; 'pypdf' reads PDFs with pypdf directly instead of LangChain's PyPDFLoader")
+   parser.add_argument("--queue-size", type=int, default=4, help="Max batches buffered between pipeline stages (--stream only)")
 
    args = parser.parse_args()
    print(args)
@@ -22,4 +33,7 @@ if __name__ == "__main__":
     max_chars = int(args.max_chars) if (args.max_chars) else 1200
     overlap = int(args.overlap) if (args.overlap) else 200
 
-    upload_directory(args.directory, max_chars=max_chars, overlap=overlap)
\ No newline at end of file
+    if args.stream:
+        stream_directory(args.directory, max_chars=max_chars, overlap=overlap, queue_size=args.queue_size, incremental=args.incremental, manifest_path=args.manifest, workers=args.workers, timeout=args.timeout, engine=args.reader, unit=args.unit)
+    else:
+        upload_directory(args.directory, max_chars=max_chars, overlap=overlap, incremental=args.incremental, manifest_path=args.manifest, workers=args.workers, timeout=args.timeout, engine=args.reader, unit=args.unit)
\ No newline at end of file
@@ -0,0 +1,95 @@
+import json, os
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+class Manifest:
+   """
+   Local record of what an incremental run put in the index: for each file (by resolved path) the
+   `file_parent_id` fingerprint it had when indexed and the chunk keys uploaded for it.  A file is only
+   recorded once its chunks have uploaded, so one that could not be read or uploaded is retried next run.
+   """
+
+   def __init__(self, path: Path):
+      self.path = Path(path)
+      self.files: Dict[str, Dict[str, Any]] = json.loads(self.path.read_text(encoding="utf-8"))["files"] if self.path.exists() else {}
+      self.by_parent: Dict[str, str] = {}
+      # resolved path -> parent id of every file `plan` returned
+      self.planned: Dict[str, str] = {}
+
+   def plan(self, fingerprints: Dict[Path, str], root_dir: Path) -> Tuple[List[Path], List[str], List[str]]:
+      """
+      Compares the current files (path -> parent id) under `root_dir` with the manifest.  Returns the paths
+      that are new or modified, the previous parent ids of modified or deleted files, and the titles of new
+      files that the manifest has no record of.  Only entries under `root_dir` can be deleted, so files
+      indexed from other directories are left alone.
+      """
+      root = Path(root_dir).resolve()
+      current = {str(p.resolve()): (p, parent_id) for p, parent_id in fingerprints.items()}
+      changed: List[Path] = []
+      stale_parent_ids: List[str] = []
+      stale_chunks = 0
+      new_titles: List[str] = []
+
+      for key, (path, parent_id) in current.items():
+         entry = self.files.get(key)
+
+         if entry and entry["parent_id"] == parent_id:
+            continue
+
+         changed.append(path)
+
+         if entry:
+            # its old chunks are about to be deleted, so it stays out of the manifest until re-uploaded
+            self.files.pop(key)
+            stale_parent_ids.append(entry["parent_id"])
+            stale_chunks += len(entry["chunk_ids"])
+         else:
+            new_titles.append(path.name)
+
+         self.by_parent[parent_id] = key
+         self.planned[key] = parent_id
+
+      for key in [key for key in self.files if key not in current and Path(key).is_relative_to(root)]:
+         entry = self.files.pop(key)
+         stale_parent_ids.append(entry["parent_id"])
+         stale_chunks += len(entry["chunk_ids"])
+
+      print(f"manifest: {len(changed)} new or modified, {len(current) - len(changed)} unchanged, {stale_chunks} stale chunks")
+      return changed, stale_parent_ids, new_titles
+
+   def add(self, docs: List[Dict[str, Any]]):
+      """Records uploaded chunks, setting the fingerprint of a changed file with its first one."""
+      for doc in docs:
+         key = self.by_parent.get(doc["parent_id"])
+
+         if key:
+            self.files.setdefault(key, {"parent_id": doc["parent_id"], "title": doc["title"], "chunk_ids": []})["chunk_ids"].append(doc["chunk_id"])
+
+   def add_empty(self, path: Path):
+      """
+      Records a planned file that was read but produced no chunks (e.g. an image-only PDF), so it is skipped
+      until it changes instead of being parsed again every run.  Files that failed to read are never passed here.
+      """
+      key = str(Path(path).resolve())
+      parent_id = self.planned.get(key)
+
+      if parent_id and self.by_parent.get(parent_id) == key:
+         self.files[key] = {"parent_id": parent_id, "title": Path(path).name, "chunk_ids": []}
+
+   def discard(self, docs: List[Dict[str, Any]]):
+      """Leaves the files of chunks that failed to upload out of the manifest, including chunks of theirs already recorded."""
+      for doc in docs:
+         key = self.by_parent.pop(doc["parent_id"], None)
+
+         if key:
+            self.files.pop(key, None)
+
+   def record(self, uploaded: List[Dict[str, Any]], failed: List[Dict[str, Any]]):
+      self.add(uploaded)
+      self.discard(failed)
+
+   def save(self):
+      self.path.parent.mkdir(parents=True, exist_ok=True)
+      tmp = self.path.with_suffix(".tmp")
+      tmp.write_text(json.dumps({"files": self.files}, indent=1), encoding="utf-8")
+      os.replace(tmp, self.path)
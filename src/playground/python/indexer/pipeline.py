@@ -0,0 +1,183 @@
+import queue, threading, time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from search import collect_docs, yield_document, ensure_index_has_metadata_field, delete_docs_by_titles, Uploader, plan_incremental, MANIFEST_PATH
+from vectorizer import vectorize_in_batch, count_tokens, EMBED_WORKERS, EMBED_TPM, BATCH_MAX_TOKENS
+from manifest import Manifest
+from extractor import extract
+
+# marks the end of a stage's output
+DONE = object()
+
+class Pipeline:
+   """
+   Streams files through read -> split -> embed -> upload.  Each stage runs on its own thread and hands
+   batches of chunk dicts to the next one through a bounded queue, so a slow stage blocks the stage feeding
+   it (backpressure) and at most `queue_size` batches per queue are held in memory at any time.
+   """
+
+   def __init__(self, max_chars: int = 1200, overlap: int = 200, upload_batch: int = 100, queue_size: int = 4, manifest: Optional[Manifest] = None, replace_titles: Optional[set[str]] = None, workers: Optional[int] = None, timeout: float = 120, engine: str = "langchain", unit: str = "chars"):
+      self.max_chars, self.overlap, self.unit = max_chars, overlap, unit
+      self.workers, self.timeout, self.engine = workers, timeout, engine
+      self.manifest, self.replace_titles = manifest, replace_titles
+      self.upload_batch = upload_batch
+      # hand the embed stage enough tokens to fill a full request for every embedding worker, but no more than
+      # the TPM bucket holds, or a group could never be sent within one minute's quota
+      self.embed_group_tokens = min(BATCH_MAX_TOKENS * EMBED_WORKERS, EMBED_TPM) if EMBED_TPM > 0 else BATCH_MAX_TOKENS * EMBED_WORKERS
+      self.chunks: queue.Queue = queue.Queue(maxsize=queue_size)
+      self.vectors: queue.Queue = queue.Queue(maxsize=queue_size)
+      self.stop = threading.Event()
+      self.errors: List[BaseException] = []
+      self.stats = {"files": 0, "chunks": 0, "embedded": 0, "uploaded": 0}
+
+   def put(self, q: queue.Queue, item: Any):
+      while not self.stop.is_set():
+         try:
+            q.put(item, timeout=0.5)
+            return
+         except queue.Full:
+            continue
+
+   def get(self, q: queue.Queue) -> Any:
+      while not self.stop.is_set():
+         try:
+            return q.get(timeout=0.5)
+         except queue.Empty:
+            continue
+
+      return DONE
+
+   def run_stage(self, target: Callable, *args):
+      try:
+         target(*args)
+      except BaseException as e:
+         print(f"[ERROR] pipeline stage '{target.__name__}' failed: {e}")
+         self.errors.append(e)
+         self.stop.set()
+
+   def read_stage(self, paths: List[Path]):
+      pending: List[Dict[str, Any]] = []
+      # counted once here and handed on, so the embed stage does not tokenize the chunks again
+      counts: Dict[str, int] = {}
+      pending_tokens = 0
+
+      for path, text in extract(paths, self.workers, self.timeout, self.engine):
+         if self.stop.is_set():
+            return
+
+         chunks = self.stats["chunks"]
+
+         for doc in yield_document(path, self.max_chars, self.overlap, text, self.unit):
+            tokens = count_tokens(doc["chunk"])
+
+            # a group never goes over the limit, so it always fits in the TPM bucket
+            if pending and pending_tokens + tokens > self.embed_group_tokens:
+               self.put(self.chunks, (pending, counts))
+               pending, counts, pending_tokens = [], {}, 0
+
+            pending.append(doc)
+            counts[doc["chunk"]] = tokens
+            pending_tokens += tokens
+            self.stats["chunks"] += 1
+
+         # a file with no text is recorded as it is, rather than planned as new every run
+         if self.manifest and self.stats["chunks"] == chunks:
+            self.manifest.add_empty(path)
+
+         self.stats["files"] += 1
+
+      if pending:
+         self.put(self.chunks, (pending, counts))
+
+      self.put(self.chunks, DONE)
+
+   def embed_stage(self):
+      while True:
+         group = self.get(self.chunks)
+
+         if group is DONE:
+            break
+
+         docs, counts = group
+         vectors = vectorize_in_batch([d["chunk"] for d in docs], token_counts=counts)
+
+         if len(vectors) != len(docs):
+            raise RuntimeError("Embedding count mismatch")
+
+         for d, v in zip(docs, vectors):
+            d["text_vector"] = v
+
+         self.stats["embedded"] += len(docs)
+         self.put(self.vectors, docs)
+
+      self.put(self.vectors, DONE)
+
+   def upload_stage(self):
+      # files enter the manifest as their chunks upload, not as they are handed to the uploader
+      uploader = Uploader(max_docs=self.upload_batch, on_uploaded=self.manifest.record if self.manifest else None)
+      written: Dict[str, set[str]] = {}
+
+      while True:
+         docs = self.get(self.vectors)
+
+         if docs is DONE:
+            break
+
+         for d in docs:
+            written.setdefault(d.get("title", ""), set()).add(d["chunk_id"])
+            uploader.add(d)
+
+      self.stats["uploaded"] = uploader.close()["uploaded"]
+
+      if self.stop.is_set():
+         return
+
+      # chunks are merged by key, so only what a previous run indexed beyond the new keys is removed
+      delete_docs_by_titles({title: keys for title, keys in written.items() if self.replace_titles is None or title in self.replace_titles})
+
+   def run(self, paths: List[Path]) -> Dict[str, int]:
+      start = time.perf_counter()
+
+      stages = [
+         threading.Thread(target=self.run_stage, args=(self.read_stage, paths), name="pipeline-read", daemon=True),
+         threading.Thread(target=self.run_stage, args=(self.embed_stage,), name="pipeline-embed", daemon=True),
+      ]
+
+      for stage in stages:
+         stage.start()
+
+      self.run_stage(self.upload_stage)
+
+      for stage in stages:
+         stage.join()
+
+      if self.errors:
+         raise RuntimeError(f"Pipeline failed: {self.errors[0]}") from self.errors[0]
+
+      if self.manifest:
+         self.manifest.save()
+
+      print(f"pipeline finished in {time.perf_counter() - start:.1f}s: {self.stats}")
+      return self.stats
+
+def stream_directory(root_dir: str, max_chars: int = 1200, overlap: int = 200, upload_batch: int = 100, queue_size: int = 4, incremental: bool = False, manifest_path: Optional[Path] = None, workers: Optional[int] = None, timeout: float = 120, engine: str = "langchain", unit: str = "chars") -> Optional[Dict[str, int]]:
+   paths = collect_docs(root_dir=root_dir)
+   manifest, replace_titles = None, None
+
+   if incremental:
+      manifest = Manifest(manifest_path or MANIFEST_PATH)
+      paths, new_titles = plan_incremental(paths, manifest, root_dir)
+      replace_titles = set(new_titles)
+
+   if (not paths):
+      print("No documents to index!")
+
+      if manifest:
+         manifest.save()
+
+      return None
+
+   ensure_index_has_metadata_field()
+
+   return Pipeline(max_chars=max_chars, overlap=overlap, upload_batch=upload_batch, queue_size=queue_size, manifest=manifest, replace_titles=replace_titles, workers=workers, timeout=timeout, engine=engine, unit=unit).run(paths)
@@ -1,42 +1,67 @@
+import hashlib
 from pathlib import Path
+from typing import Iterator, Tuple
 from pypdf import PdfReader
-from docx import Document as DocxDocument
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader, BSHTMLLoader
+
+ENGINES = ("langchain", "pypdf")
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".html", ".htm", ".txt", ".md")
 
 def loader_for_path(path: Path):
+   # imported here so processes that never use a LangChain loader don't pay for importing them
+   from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader, BSHTMLLoader
+
    ext = path.suffix.lower()
 
    if ext == ".pdf":
       return PyPDFLoader(str(path))
-   
+
    if ext == ".docx":
       return Docx2txtLoader(str(path))
-   
+
    if ext in (".html", ".htm"):
       return BSHTMLLoader(str(path), open_encoding="utf-8", bs_kwargs={"features": "html.parser"})
-   
+
    if ext in (".txt", ".md"):
       return TextLoader(str(path), encoding="utf-8")
-   
-   return None 
+
+   return None
 
 def is_supported(path: Path):
-   return ((path is not None) and (path.is_file()) and (loader_for_path(path) is not None))
+   return ((path is not None) and (path.is_file()) and (path.suffix.lower() in SUPPORTED_EXTENSIONS))
 
-def read(path: Path) -> str:
+def file_parent_id(path: Path) -> str:
+   stat = path.stat()
+   h = hashlib.sha256()
+   h.update(str(path.resolve()).encode("utf-8"))
+   h.update(str(stat.st_size).encode("utf-8"))
+   h.update(str(int(stat.st_mtime)).encode("utf-8"))
+   return h.hexdigest()[:32]
+
+def iter_pdf_pages(path: Path) -> Iterator[Tuple[int, str]]:
+   """
+   Yields `(page_number, text)` for each page of a PDF straight from pypdf, one page at a time, without
+   building a LangChain `Document` per page.
+   """
+   reader = PdfReader(str(path))
+
+   for number, page in enumerate(reader.pages, start=1):
+      yield number, (page.extract_text() or "").strip()
+
+def read(path: Path, engine: str = "langchain") -> str:
    """
    Use LangChain loaders to extract text. Many loaders return per-page/per-section Documents.
-   Concatenate their page_content.
+   Concatenate their page_content.  With `engine="pypdf"`, PDFs are read page by page with pypdf directly
+   and other formats still go through LangChain.  Raises when the file cannot be parsed, so a failure is not
+   mistaken for an empty file.
    """
+   if engine == "pypdf" and path.suffix.lower() == ".pdf":
+      return "\n".join(text for _, text in iter_pdf_pages(path) if text).strip()
+
    loader = loader_for_path(path)
 
    if not loader:
       return ""
-   
-   try:
-      docs = loader.load()
-   except Exception as e:
-      print(f"[WARN] Failed to read {path}: {e}")
-      return ""
-   
-   return "\n".join((d.page_content or "").strip() for d in docs if d.page_content).strip()
\ No newline at end of file
+
+   docs = loader.load()
+
+   return "\n".join((d.page_content or "").strip() for d in docs if d.page_content).strip()
@@ -1,29 +1,40 @@
-import json, hashlib, uuid
+import json, hashlib, threading, time
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, Future
 from datetime import datetime
-from typing import Dict, Optional, Iterable, List, Any
+from typing import Callable, Dict, Optional, Iterable, List, Any
 
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from azure.search.documents.indexes import SearchIndexClient
+from azure.core.exceptions import HttpResponseError
+from azure.search.documents import RequestEntityTooLargeError
 from azure.search.documents.indexes.models import SearchIndex
 
-from reader import read, is_supported
+from reader import read, is_supported, file_parent_id
+from extractor import extract
 from splitter import split
 from vectorizer import vectorize_in_batch
-from shared.config_loader import load_config
+from manifest import Manifest
+from shared.config_loader import load_config, BASE_DIR
+from shared.cache import bump_index_version
+from shared.search import get_search_client, get_index_client
+from shared.transport import transport_stats
 
 config = load_config()
 
-SEARCH_ENDPOINT, SEARCH_INDEX, SEARCH_API_KEY = config['AZURE_SEARCH_ENDPOINT'], config['AZURE_SEARCH_INDEX'], config['AZURE_SEARCH_API_KEY']
+SEARCH_INDEX = config['AZURE_SEARCH_INDEX']
+MANIFEST_PATH = BASE_DIR / ".cache" / f"{SEARCH_INDEX}-manifest.json"
+UPLOAD_WORKERS, UPLOAD_MAX_BYTES = config['UPLOAD_WORKERS'], config['UPLOAD_MAX_MB'] * 1024 * 1024
 
-credential = AzureKeyCredential(SEARCH_API_KEY)
-search_client = SearchClient(SEARCH_ENDPOINT, SEARCH_INDEX, credential)
-index_client = SearchIndexClient(SEARCH_ENDPOINT, credential)
+# the service accepts at most 1000 documents and 16 MB per indexing request
+UPLOAD_MAX_DOCS = 1000
+# the largest `skip` the service accepts
+MAX_SKIP = 100000
+# conflicts, throttling and unavailability are worth retrying; anything else is a bad document
+RETRYABLE_STATUS = {409, 422, 429, 503}
+max_upload_retries = 4
 
 def ensure_index_has_metadata_field():
    try:
-      idx: SearchIndex = index_client.get_index(SEARCH_INDEX)
+      idx: SearchIndex = get_index_client().get_index(SEARCH_INDEX)
    except Exception as e:
       raise RuntimeError(f"Index '{SEARCH_INDEX}' not found. Create it first. ({e})")
    
@@ -37,13 +48,12 @@ def ensure_index_has_metadata_field():
    if "meta_data" not in field_names:
       raise RuntimeError("Index is missing 'meta_data' field. Add an Edm.String field named 'metadata' " "(searchable=false, retrievable=true, stored=true) and re-create the index." )
    
-def file_parent_id(path: Path) -> str:
-   stat = path.stat()
-   h = hashlib.sha256()
-   h.update(str(path.resolve()).encode("utf-8"))
-   h.update(str(stat.st_size).encode("utf-8"))
-   h.update(str(int(stat.st_mtime)).encode("utf-8"))
-   return h.hexdigest()[:32]
+def chunk_key(parent_id: str, idx: int, chunk: str) -> str:
+   """
+   Deterministic document key: the same file content split the same way always produces the same keys,
+   so re-uploads overwrite in place instead of piling up duplicates.
+   """
+   return f"{parent_id}_{idx}_{hashlib.sha256(chunk.encode('utf-8')).hexdigest()[:16]}"
 
 def build_metadata(path: Path, extra: Optional[Dict] = None) -> str:
    data = {
@@ -60,99 +70,260 @@ def build_metadata(path: Path, extra: Optional[Dict] = None) -> str:
    return json.dumps(data, ensure_ascii=False)
 
 
-def yield_document(path: Path, max_chars: int = 1200, overlap: int = 200) -> Iterable[Dict[str, Any]]:
-   text = read(path)
+def yield_document(path: Path, max_chars: int = 1200, overlap: int = 200, text: Optional[str] = None, unit: str = "chars") -> Iterable[Dict[str, Any]]:
+   text = read(path) if text is None else text
 
    if not text:
       yield from ()
       return
 
-   chunks = split(text, max_chars, overlap)
+   chunks = split(text, max_chars, overlap, unit)
+   parent_id = file_parent_id(path)
 
    for idx, chunk in enumerate(chunks):
       yield {
-         "chunk_id": str(uuid.uuid4()),
-         "parent_id": file_parent_id(path),
+         "chunk_id": chunk_key(parent_id, idx, chunk),
+         "parent_id": parent_id,
          "title": path.name,
          "chunk": chunk,
          # 'text_vector' populated later
          "meta_data": build_metadata(path, {"chunk_index": idx, "total_chunks": len(chunks)}),
       }
 
-def delete_docs_by_title(title: str, batch_size = 1000) -> int:
+def find_docs(search_text: str = "*", search_fields: Optional[List[str]] = None, filter: Optional[str] = None, select: Optional[List[str]] = None, page_size: int = 1000) -> List[Dict]:
+   """
+   Returns every match of a query, paging with `top`/`skip` and selecting only the given fields (the key by
+   default).  Pages are ordered by the key, since the service keeps no stable order between requests, and
+   all of them are collected before anything is deleted so deletes cannot shift later pages.
+   """
+   docs: List[Dict] = []
+
+   while True:
+      if len(docs) > MAX_SKIP:
+         raise RuntimeError(f"More than {MAX_SKIP + page_size} documents match '{filter or search_text}'; narrow the query, the service cannot page past skip={MAX_SKIP}.")
+
+      page = [dict(r) for r in get_search_client().search(
+         search_text=search_text,
+         search_fields=search_fields,
+         filter=filter,
+         select=select or ["chunk_id"],
+         query_type="simple",
+         order_by=["chunk_id"],
+         top=page_size,
+         skip=len(docs)
+      )]
+
+      docs.extend(page)
+
+      if len(page) < page_size:
+         return docs
+
+def delete_docs_by_keys(chunk_ids: List[str], batch_size = 1000, max_workers: int = 4) -> int:
+   """Deletes documents by `chunk_id`, sending up to `max_workers` delete batches concurrently."""
+   if not chunk_ids:
+      return 0
+
+   def delete(batch_ids: List[str]) -> int:
+      result = get_search_client().delete_documents(documents=[{"chunk_id": cid} for cid in batch_ids])
+      bump_index_version()
+      return sum(1 for r in result if r.succeeded)
+
+   with ThreadPoolExecutor(max_workers=max_workers) as pool:
+      return sum(pool.map(delete, batch(chunk_ids, batch_size)))
+
+def delete_docs_by_parent_ids(parent_ids: Iterable[str], keep: Optional[set[str]] = None, ids_per_filter: int = 50) -> int:
+   """
+   Deletes every chunk whose `parent_id` is in `parent_ids` (except keys in `keep`) in one pass: `parent_id`
+   is filterable, so ids are OR'ed together with `search.in` and only the key is retrieved.
+   """
+   parent_ids = sorted(set(parent_ids))
+   ids_to_delete: List[str] = []
+
+   for group in batch(parent_ids, ids_per_filter):
+      # parent ids are hex digests, so no quoting is needed inside search.in
+      for doc in find_docs(filter=f"search.in(parent_id, '{','.join(group)}', ',')"):
+         if not (keep and doc["chunk_id"] in keep):
+            ids_to_delete.append(doc["chunk_id"])
+
+   total_deleted = delete_docs_by_keys(ids_to_delete)
+
+   if total_deleted:
+      print(f"removed {total_deleted} docs for {len(parent_ids)} parent ids!")
+
+   return total_deleted
+
+def delete_docs_by_titles(titles: Dict[str, Optional[set[str]]], titles_per_query: int = 20) -> int:
    """
-   Finds all documents with an exact matching `title` and deletes them by `chunk_id`.
-   Returns the number of deleted documents.
+   Finds all documents with an exact matching title and deletes them by `chunk_id`, except the keys mapped
+   to each title (the chunks just written for it).  Returns the number of deleted documents.
 
    Notes:
-   - `title` is not filterable in your index, so we use a phrase full-text search on `title`
-      and then exact-match the title client-side.
+   - `title` is not filterable in your index, so the titles are OR'ed into one phrase full-text search on
+      `title` per group and then exact-matched client-side.
    - `chunk_id` is the key field and is required for deletion.
    """
+   titles = {title: keep for title, keep in titles.items() if title}
 
-   if (not title):
+   if not titles:
       return 0
-   
-   print(f"removing docs with title ({title}) ...")
 
-   # Phrase-search the title field, then exact-match in Python
-   # Using quotes forces a phrase query; we still verify equality client-side.
-   query = f"\"{title}\""
-   
-   results = search_client.search(
-      search_text=query,
-      search_fields=["title"],
-      select=["chunk_id", "title"],
-      query_type="simple",
-      top=batch_size
-   )
+   print(f"removing stale docs for titles ({len(titles)}) ...")
 
    ids_to_delete: List[str] = []
 
-   for r in results:
-      doc: Dict = dict(r)  
-      
-      if doc.get("title") == title and "chunk_id" in doc:
-         ids_to_delete.append(doc["chunk_id"])
+   for group in batch(sorted(titles), titles_per_query):
+      # Using quotes forces a phrase query per title; we still verify equality client-side.
+      query = " | ".join('"' + title.replace('\\', '\\\\').replace('"', '\\"') + '"' for title in group)
 
-   if not ids_to_delete:
-      return 0
+      for doc in find_docs(search_text=query, search_fields=["title"], select=["chunk_id", "title"]):
+         keep = titles.get(doc.get("title"), ())
 
-   total_deleted = 0
+         if doc.get("title") in titles and not (keep and doc["chunk_id"] in keep):
+            ids_to_delete.append(doc["chunk_id"])
 
-   for i in range(0, len(ids_to_delete), batch_size):
-      batch_ids = ids_to_delete[i:i + batch_size]
-      batch = [{"chunk_id": cid} for cid in batch_ids]
-      result = search_client.delete_documents(documents=batch)
-      total_deleted += sum(1 for r in result if r.succeeded)
+   total_deleted = delete_docs_by_keys(ids_to_delete)
 
-   print(f"removed {total_deleted} docs with title ({title})!")
+   print(f"removed {total_deleted} stale docs for titles ({len(titles)})!")
    return total_deleted
 
-def batch(iterable: List[Dict], n: int) -> Iterable[List[Dict]]:
+def delete_docs_by_title(title: str, keep: Optional[set[str]] = None) -> int:
+   return delete_docs_by_titles({title: keep})
+
+def batch(iterable: List[Any], n: int) -> Iterable[List[Any]]:
    for i in range(0, len(iterable), n):
       yield iterable[i:i+n]
 
-def upload_docs(docs: List[Dict[str, Any]], upload_batch = 10):
-   ensure_index_has_metadata_field()
+def doc_size(doc: Dict[str, Any]) -> int:
+   return len(json.dumps(doc, ensure_ascii=False).encode("utf-8"))
+
+def upload_docs_batch(docs_batch: List[Dict[str, Any]], attempt: int = 0) -> List[str]:
+   """
+   Merges one batch into the index and returns the keys of the documents that succeeded.  Documents that fail with a
+   transient status (or a whole batch rejected as throttled) are retried in two smaller batches after a
+   back-off; the SDK already halves batches the service rejects with 413.
+   """
+   try:
+      result = get_search_client().merge_or_upload_documents(docs_batch)
+   except RequestEntityTooLargeError:
+      print(f"[ERROR] document {docs_batch[0].get('chunk_id')} alone exceeds the request size limit")
+      return []
+   except HttpResponseError as e:
+      if e.status_code not in RETRYABLE_STATUS or attempt >= max_upload_retries:
+         raise
+
+      time.sleep(2 ** attempt)
+      return [key for part in halves(docs_batch) for key in upload_docs_batch(part, attempt + 1)]
+
+   bump_index_version()
+   failures = [r for r in result if not r.succeeded]
+   retry_keys = {r.key for r in failures if r.status_code in RETRYABLE_STATUS} if attempt < max_upload_retries else set()
+   permanent = [r for r in failures if r.key not in retry_keys]
 
-   total = 0
+   if permanent:
+      print(f"[ERROR] {len(permanent)} items failed in this batch:")
 
-   for title in set([doc.get("title", '') for doc in docs]):
-      delete_docs_by_title(title)
+      for f in permanent[:5]:
+         print(f"   key={f.key} error={getattr(f, 'error_message', 'unknown')}")
 
-   for docs_batch in batch(docs, upload_batch):
-      result = search_client.upload_documents(docs_batch)
-      failures = [r for r in result if not r.succeeded]
+   succeeded = [r.key for r in result if r.succeeded]
 
-      if failures:
-         print(f"[ERROR] {len(failures)} items failed in this batch:")
+   if retry_keys:
+      time.sleep(2 ** attempt)
+      succeeded += [key for part in halves([d for d in docs_batch if d["chunk_id"] in retry_keys]) for key in upload_docs_batch(part, attempt + 1)]
 
-         for f in failures[:5]:
-            print(f"   key={f.key} error={getattr(f, 'error_message', 'unknown')}")
+   return succeeded
+
+def halves(docs: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+   mid = (len(docs) + 1) // 2
+   return [part for part in (docs[:mid], docs[mid:]) if part]
+
+class Uploader:
+   """
+   Groups documents into batches of at most `max_docs` documents and `max_bytes` of serialized JSON, and
+   keeps up to `workers` batches in flight.  `add` blocks while all workers are busy, so a producer can't
+   outrun the index.  Call `close` to flush the last batch, wait for the rest and report docs/sec and bytes/sec.
+   `on_uploaded(uploaded, failed)` is called with the documents of every finished batch.
+   """
 
-      total += len(docs_batch)
-      print(f"Uploaded {total}/{len(docs)} ...")
+   def __init__(self, max_docs: int = UPLOAD_MAX_DOCS, max_bytes: int = UPLOAD_MAX_BYTES, workers: int = UPLOAD_WORKERS, on_uploaded: Optional[Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], None]] = None):
+      self.max_docs, self.max_bytes = max_docs, max_bytes
+      self.on_uploaded = on_uploaded
+      self.pool = ThreadPoolExecutor(max_workers=workers)
+      self.slots = threading.Semaphore(workers)
+      self.lock = threading.Lock()
+      self.futures: List[Future] = []
+      self.pending: List[Dict[str, Any]] = []
+      self.pending_bytes = 0
+      self.stats = {"docs": 0, "uploaded": 0, "bytes": 0}
+      self.start = time.perf_counter()
+
+   def add(self, doc: Dict[str, Any]):
+      size = doc_size(doc)
+
+      if self.pending and (len(self.pending) >= self.max_docs or self.pending_bytes + size > self.max_bytes):
+         self.flush()
+
+      self.pending.append(doc)
+      self.pending_bytes += size
+
+   def flush(self):
+      if not self.pending:
+         return
+
+      docs_batch, size = self.pending, self.pending_bytes
+      self.pending, self.pending_bytes = [], 0
+
+      self.slots.acquire()
+      future = self.pool.submit(upload_docs_batch, docs_batch)
+      future.add_done_callback(lambda f: self.done(f, docs_batch, size))
+      self.futures.append(future)
+
+   def done(self, future: Future, docs_batch: List[Dict[str, Any]], size: int):
+      self.slots.release()
+      keys = set(future.result()) if not future.exception() else set()
+
+      with self.lock:
+         self.stats["docs"] += len(docs_batch)
+         self.stats["bytes"] += size
+         self.stats["uploaded"] += len(keys)
+         print(f"Uploaded {self.stats['uploaded']}/{self.stats['docs']} docs sent so far ...")
+
+         if self.on_uploaded:
+            self.on_uploaded([d for d in docs_batch if d["chunk_id"] in keys], [d for d in docs_batch if d["chunk_id"] not in keys])
+
+   def close(self) -> Dict[str, float]:
+      self.flush()
+      self.pool.shutdown(wait=True)
+
+      for future in self.futures:
+         # surfaces the first non-retryable error
+         future.result()
+
+      elapsed = max(time.perf_counter() - self.start, 1e-6)
+      self.stats.update({"docs/sec": round(self.stats["uploaded"] / elapsed, 1), "MB/sec": round(self.stats["bytes"] / elapsed / 1e6, 2)})
+      print(f"upload finished in {elapsed:.1f}s: {self.stats}")
+      print(f"connections: {transport_stats()}")
+
+      return self.stats
+
+def upload_docs(docs: List[Dict[str, Any]], upload_batch = UPLOAD_MAX_DOCS, replace_titles: Optional[Iterable[str]] = None, manifest: Optional[Manifest] = None):
+   """
+   Merges `docs` into the index by key, then removes chunks previously indexed under the same titles that
+   were not rewritten (the tail beyond the new chunk count, or chunks of an older version of the file).
+   `replace_titles` limits that clean-up to the given titles (incremental runs already removed the rest by
+   key); by default every title in `docs`.  Uploaded chunks are recorded in `manifest`.
+   """
+   ensure_index_has_metadata_field()
+
+   titles = set([doc.get("title", '') for doc in docs]) if replace_titles is None else set(replace_titles)
+   uploader = Uploader(max_docs=upload_batch, on_uploaded=manifest.record if manifest else None)
+
+   for doc in docs:
+      uploader.add(doc)
+
+   uploader.close()
+
+   delete_docs_by_titles({title: {doc["chunk_id"] for doc in docs if doc.get("title") == title} for title in titles})
 
 def collect_docs(root_dir) -> List[Path]:
    print(f'collecting files in root directory {root_dir} ...')
@@ -161,19 +332,45 @@ def collect_docs(root_dir) -> List[Path]:
 
    return paths
 
-def upload_directory(root_dir: str, max_chars: int = 1200, overlap: int = 200, upload_batch: int = 1000):
+def plan_incremental(paths: List[Path], manifest: Manifest, root_dir: str) -> tuple[List[Path], List[str]]:
+   """
+   Skips files whose fingerprint matches the manifest and removes the chunks of modified files, and of
+   files deleted from under `root_dir`, by their previous parent id.  Returns the paths that still need
+   indexing and the titles of files the manifest has not seen.
+   """
+   changed, stale_parent_ids, new_titles = manifest.plan({path: file_parent_id(path) for path in paths}, Path(root_dir))
+   delete_docs_by_parent_ids(stale_parent_ids)
+
+   return changed, new_titles
+
+def upload_directory(root_dir: str, max_chars: int = 1200, overlap: int = 200, upload_batch: int = 1000, incremental: bool = False, manifest_path: Optional[Path] = None, workers: Optional[int] = None, timeout: float = 120, engine: str = "langchain", unit: str = "chars"):
    paths = collect_docs(root_dir=root_dir)
+   manifest, replace_titles = None, None
+
+   if incremental:
+      manifest = Manifest(manifest_path or MANIFEST_PATH)
+      paths, replace_titles = plan_incremental(paths, manifest, root_dir)
 
    if (not paths):
       print("No documents to index!")
+
+      if manifest:
+         manifest.save()
+
       return  
    
    docs: List[Dict[str, Any]] = []
    
-   for path in paths:
-      for doc in yield_document(path, max_chars, overlap):
+   for path, text in extract(paths, workers, timeout, engine):
+      count = len(docs)
+
+      for doc in yield_document(path, max_chars, overlap, text, unit):
          docs.append(doc)
 
+      # a file with no text is recorded as it is, rather than planned as new every run
+      if manifest and len(docs) == count:
+         manifest.add_empty(path)
+
    chunks = [d["chunk"] for d in docs]
    vectors = vectorize_in_batch(chunks)
 
@@ -183,4 +380,7 @@ def upload_directory(root_dir: str, max_chars: int = 1200, overlap: int = 200, u
    for d, v in zip(docs, vectors):
       d["text_vector"] = v
 
-   upload_docs(docs, upload_batch=upload_batch)
\ No newline at end of file
+   upload_docs(docs, upload_batch=upload_batch, replace_titles=replace_titles, manifest=manifest)
+
+   if manifest:
+      manifest.save()
\ No newline at end of file
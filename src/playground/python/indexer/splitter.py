@@ -1,16 +1,104 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import Iterable, List, Dict, Optional, Any
+from collections import deque
+from typing import Callable, Iterator, Any
+
+SEPARATORS = ["\n\n", "\n", ". ", "? ", "! ", "; ", ": ", ", ", " ", ""]
+UNITS = ("chars", "tokens")
 
 splitters: dict[str, Any] = {}
+encoders: dict[str, Callable[[str], int]] = {}
+
+def get_splitter(max_chars: int = 1200, overlap: int = 200):
+   """LangChain's RecursiveCharacterTextSplitter with the same settings; kept as the reference for `split`."""
+   from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-def get_splitter(max_chars: int = 1200, overlap: int = 200) -> RecursiveCharacterTextSplitter:
    key = f"{max_chars}:{overlap}"
 
    if (splitters.get(key, None) is None):
-      splitters[key] = RecursiveCharacterTextSplitter(chunk_size=max_chars, chunk_overlap=overlap, separators=["\n\n", "\n", ". ", "? ", "! ", "; ", ": ", ", ", " ", ""])
+      splitters[key] = RecursiveCharacterTextSplitter(chunk_size=max_chars, chunk_overlap=overlap, separators=SEPARATORS)
 
    return splitters[key]
 
+def token_counter(encoding: str = "cl100k_base") -> Callable[[str], int]:
+   """Counts tokens with the embedding models' tokenizer (cl100k_base for text-embedding-ada-002 and -3)."""
+   if encoding not in encoders:
+      import tiktoken
+
+      encoder = tiktoken.get_encoding(encoding)
+      encoders[encoding] = lambda text: len(encoder.encode(text, disallowed_special=()))
+
+   return encoders[encoding]
+
+def pieces(text: str, separator: str) -> list[str]:
+   # the separator stays at the start of the piece that follows it, as with LangChain's keep_separator=True
+   if not separator:
+      return list(text)
+
+   parts = text.split(separator)
+   return ([parts[0]] if parts[0] else []) + [separator + p for p in parts[1:]]
+
+def merge(splits: list[str], lengths: list[int], max_size: int, overlap: int) -> Iterator[str]:
+   """Packs consecutive pieces into chunks of at most `max_size`, carrying up to `overlap` into the next."""
+   current: deque = deque()
+   total = 0
+
+   for piece, size in zip(splits, lengths):
+      if total + size > max_size and current:
+         chunk = "".join(p for p, _ in current).strip()
+
+         if chunk:
+            yield chunk
+
+         while total > overlap or (total + size > max_size and total > 0):
+            total -= current.popleft()[1]
+
+      current.append((piece, size))
+      total += size
+
+   chunk = "".join(p for p, _ in current).strip()
+
+   if chunk:
+      yield chunk
+
+def iter_split(text: str, max_size: int = 1200, overlap: int = 200, length: Callable[[str], int] = len, separators: list[str] = SEPARATORS) -> Iterator[str]:
+   """
+   Yields the same chunks as LangChain's RecursiveCharacterTextSplitter, as soon as each one is complete.
+   The text is split once on the coarsest separator it contains; only pieces that are still too long are
+   split again on the finer separators, and each piece's length is measured once.
+   """
+   separator, finer = separators[-1], []
+
+   for i, s in enumerate(separators):
+      if not s or s in text:
+         separator, finer = s, separators[i + 1:] if s else []
+         break
+
+   good: list[str] = []
+   sizes: list[int] = []
+
+   for piece in pieces(text, separator):
+      size = length(piece)
+
+      if size < max_size:
+         good.append(piece)
+         sizes.append(size)
+         continue
+
+      if good:
+         yield from merge(good, sizes, max_size, overlap)
+         good, sizes = [], []
+
+      if finer:
+         yield from iter_split(piece, max_size, overlap, length, finer)
+      else:
+         yield piece
+
+   if good:
+      yield from merge(good, sizes, max_size, overlap)
 
-def split(text: str, max_chars: int = 1200, overlap: int = 200) -> list[str]:
-   return get_splitter(max_chars, overlap).split_text(text)
\ No newline at end of file
+def split(text: str, max_chars: int = 1200, overlap: int = 200, unit: str = "chars") -> list[str]:
+   """
+   Splits `text` into chunks of at most `max_chars` with `overlap` carried between chunks.  With
+   `unit="tokens"` both are measured in embedding-model tokens instead of characters.
+   """
+   length = token_counter() if unit == "tokens" else len
+   return list(iter_split(text, max_chars, overlap, length))
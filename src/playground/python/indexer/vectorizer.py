@@ -1,47 +1,228 @@
-import os, time
-from typing import List
-from langchain_openai import AzureOpenAIEmbeddings
-from openai import RateLimitError
+import time, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from openai import AzureOpenAI, RateLimitError, APIConnectionError, APIStatusError
 from shared.config_loader import load_config
+from shared.cache import get_embedding_cache
+from shared.transport import get_http_client
+from shared.search import embedding_options
 
 config = load_config()
 
 AOAI_ENDPOINT, AOAI_API_KEY, AOAI_EMBED_DEPLOYMENT, AOAI_API_VERSION = config['AZURE_OPENAI_ENDPOINT'], config['AZURE_OPENAI_API_KEY'], config['AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT'], config['AZURE_OPENAI_API_VERSION']
+EMBED_TPM, EMBED_RPM, EMBED_WORKERS = config['AZURE_OPENAI_EMBEDDINGS_TPM'], config['AZURE_OPENAI_EMBEDDINGS_RPM'], config['EMBEDDING_WORKERS']
+BATCH_MAX_INPUTS, BATCH_MAX_TOKENS = config['EMBEDDING_BATCH_MAX_INPUTS'], config['EMBEDDING_BATCH_MAX_TOKENS']
 
-def get_embedder() -> AzureOpenAIEmbeddings:
-    os.environ.setdefault("AZURE_OPENAI_API_KEY", AOAI_API_KEY)
-    os.environ.setdefault("AZURE_OPENAI_ENDPOINT", AOAI_ENDPOINT)
-    os.environ.setdefault("AZURE_OPENAI_API_VERSION", AOAI_API_VERSION)
-    return AzureOpenAIEmbeddings(model=AOAI_EMBED_DEPLOYMENT)
+# the embedding models reject any single input longer than this
+MAX_INPUT_TOKENS = 8191
 
-embedder = get_embedder()
-max_retries = 3
+embedder: Optional[AzureOpenAI] = None
 
-def vectorize_in_batch(chunks: List[str], batch_size: int = 30) -> List[List[float]]:
-   print(f'creating vectors for chunks {len(chunks)} ...')
+def get_embedder() -> AzureOpenAI:
+   global embedder
 
-   vectors: List[List[float]] = []
-   pause, error_pause = 1.0, 0.5
+   # built on first use, so importing the indexer modules does not construct a client
+   if embedder is None:
+      # retries are handled by EmbeddingEngine so that Retry-After is honored across all workers
+      embedder = AzureOpenAI(azure_endpoint=AOAI_ENDPOINT, api_key=AOAI_API_KEY, api_version=AOAI_API_VERSION, max_retries=0, http_client=get_http_client())
 
-   for i in range(0, len(chunks), batch_size): 
-      batch = chunks[i: (i + batch_size)] 
-      
-      for _ in range(max_retries):
-         try:
-            print(f'vectorizing batch (#{i}). {len(chunks)} total ...')
-            vectors.extend(embedder.embed_documents(batch)) 
+   return embedder
+max_retries = 6
+
+def estimate_tokens(text: str) -> int:
+   # ~4 characters per token for English text with the OpenAI tokenizers
+   return len(text) // 4 + 1
+
+counter = None
+
+def count_tokens(text: str) -> int:
+   """Counts tokens with the model's tokenizer when tiktoken and its encoding are available, else estimates."""
+   global counter
+
+   if counter is None:
+      try:
+         from splitter import token_counter
+         counter = token_counter()
+      except Exception as e:
+         print(f'[WARN] tokenizer unavailable, estimating token counts ({e})')
+         counter = estimate_tokens
+
+   return counter(text)
+
+def plan_batches(chunks: List[str], max_inputs: int = BATCH_MAX_INPUTS, max_tokens: int = BATCH_MAX_TOKENS, token_counts: Optional[Dict[str, int]] = None) -> List[Tuple[List[str], int]]:
+   """
+   Packs consecutive chunks into embedding requests of at most `max_inputs` chunks and `max_tokens` tokens,
+   returning each batch with its token total for the rate limiter and metrics.  Chunks in `token_counts`
+   (counted by the caller already) are not tokenized again.
+   """
+   batches: List[Tuple[List[str], int]] = []
+   batch: List[str] = []
+   total = 0
+   token_counts = token_counts or {}
+
+   for chunk in chunks:
+      tokens = token_counts[chunk] if chunk in token_counts else count_tokens(chunk)
+
+      if tokens > MAX_INPUT_TOKENS:
+         print(f'[WARN] chunk of {tokens} tokens exceeds the model limit of {MAX_INPUT_TOKENS}; the request will fail')
+
+      if batch and (len(batch) >= max_inputs or total + tokens > max_tokens):
+         batches.append((batch, total))
+         batch, total = [], 0
+
+      batch.append(chunk)
+      total += tokens
+
+   if batch:
+      batches.append((batch, total))
+
+   return batches
+
+def retry_after(e: APIStatusError, attempt: int) -> float:
+   headers = e.response.headers if e.response is not None else {}
+
+   try:
+      if headers.get("retry-after-ms"):
+         return float(headers["retry-after-ms"]) / 1000
+
+      if headers.get("retry-after"):
+         return float(headers["retry-after"])
+   except ValueError:
+      pass
+
+   return min(2 ** attempt, 60)
+
+class TokenBucket:
+   """
+   Refills `per_minute` units evenly over a minute, starting full.  `acquire` blocks until `amount` units
+   are available, so callers never exceed the deployment's TPM/RPM quota.  A `per_minute` of 0 (or less)
+   means no limit.
+   """
+
+   def __init__(self, per_minute: int):
+      self.capacity = float(per_minute)
+      self.available = self.capacity
+      self.rate = self.capacity / 60
+      self.updated = time.monotonic()
+      self.lock = threading.Lock()
+
+   def acquire(self, amount: float = 1):
+      if self.rate <= 0:
+         return
+
+      amount = min(amount, self.capacity)
+
+      while True:
+         with self.lock:
+            now = time.monotonic()
+            self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.available >= amount:
+               self.available -= amount
+               return
+
+            wait = (amount - self.available) / self.rate
 
-            print(f'{len(chunks)} vector arrays created of dimension {len(vectors[-1])})')
-            print('pausing ({pause} seconds) to avoid rate limit ...')
-            
-            time.sleep(pause) 
+         time.sleep(wait)
 
-            break
+class EmbeddingEngine:
+   """
+   Embeds batches on a thread pool with several requests in flight.  Requests are paced by token buckets
+   sized to the deployment's quota, and a 429 pauses every worker for the service's Retry-After.
+   """
+
+   def __init__(self, workers: int = EMBED_WORKERS, tpm: int = EMBED_TPM, rpm: int = EMBED_RPM):
+      self.workers = max(1, workers)
+      self.tokens, self.requests = TokenBucket(tpm), TokenBucket(rpm)
+      self.blocked_until = 0.0
+      self.lock = threading.Lock()
+      self.stats = {"requests": 0, "tokens": 0, "throttled": 0}
+
+   def throttle(self, seconds: float):
+      with self.lock:
+         self.stats["throttled"] += 1
+         self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+   def wait_if_throttled(self):
+      delay = self.blocked_until - time.monotonic()
+
+      if delay > 0:
+         time.sleep(delay)
+
+   def embed_batch(self, batch: List[str], estimate: int) -> List[List[float]]:
+      for attempt in range(max_retries):
+         self.wait_if_throttled()
+         self.requests.acquire(1)
+         self.tokens.acquire(estimate)
+
+         try:
+            response = get_embedder().embeddings.create(input=batch, **embedding_options())
          except RateLimitError as e:
-            print(e)
-            time.sleep(error_pause) 
-            error_pause += 0.5
-            
+            delay = retry_after(e, attempt)
+            print(f'rate limited; retrying in {delay:.1f} seconds ...')
+            self.throttle(delay)
+            continue
+         except APIConnectionError as e:
+            print(f'[WARN] embedding request failed: {e}')
+            time.sleep(min(2 ** attempt, 60))
+            continue
+         except APIStatusError as e:
+            if e.status_code < 500:
+               raise
+
+            print(f'[WARN] embedding request failed ({e.status_code}); retrying ...')
+            time.sleep(retry_after(e, attempt))
+            continue
+
+         with self.lock:
+            self.stats["requests"] += 1
+            self.stats["tokens"] += response.usage.prompt_tokens if response.usage else estimate
+
+         return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+      raise RuntimeError(f"Embedding batch of {len(batch)} chunks failed after {max_retries} attempts")
+
+   def embed(self, chunks: List[str], max_inputs: int = BATCH_MAX_INPUTS, max_tokens: int = BATCH_MAX_TOKENS, token_counts: Optional[Dict[str, int]] = None) -> List[List[float]]:
+      batches = plan_batches(chunks, max_inputs, max_tokens, token_counts)
+      tokens_before, start = self.stats["tokens"], time.perf_counter()
+
+      with ThreadPoolExecutor(max_workers=min(self.workers, len(batches) or 1)) as pool:
+         results = list(pool.map(lambda b: self.embed_batch(*b), batches))
+
+      elapsed = max(time.perf_counter() - start, 1e-6)
+      tokens = self.stats["tokens"] - tokens_before
+      print(f'{len(batches)} batches (avg {len(chunks) / max(len(batches), 1):.0f} chunks, {sum(t for _, t in batches) / max(len(batches), 1):.0f} tokens) embedded in {elapsed:.1f}s ({tokens / elapsed:.0f} tokens/sec, {self.stats["throttled"]} throttled so far)')
+
+      return [v for vectors in results for v in vectors]
+
+engine: Optional[EmbeddingEngine] = None
+
+def get_engine() -> EmbeddingEngine:
+   global engine
+
+   if engine is None:
+      engine = EmbeddingEngine()
+
+   return engine
+
+def vectorize_in_batch(chunks: List[str], max_inputs: int = BATCH_MAX_INPUTS, max_tokens: int = BATCH_MAX_TOKENS, token_counts: Optional[Dict[str, int]] = None) -> List[List[float]]:
+   print(f'creating vectors for chunks {len(chunks)} ...')
+
+   cache = get_embedding_cache()
+   cached = cache.lookup(chunks) if cache else {}
+   hits = len(cached)
+   missing = list(dict.fromkeys(c for c in chunks if c not in cached))
+
+   if missing:
+      vectors = get_engine().embed(missing, max_inputs, max_tokens, token_counts)
+      cached.update(zip(missing, vectors))
+
+      if cache:
+         cache.store(missing, vectors)
+
+   if cache:
+      print(f'embedding cache: {hits} hits, {len(missing)} misses ({cache.stats()})')
 
    print(f'vectors created for chunks ({len(chunks)})!')
-   return vectors
+   return [cached[c] for c in chunks]
@@ -3,19 +3,19 @@ from pathlib import Path
 from fastmcp import FastMCP
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
-from shared.search import run
+from shared.search import arun
 
 mcp = FastMCP("Hoisington")
 
 @mcp.tool()
-def analyze(text: str) -> str:
+async def analyze(text: str) -> str:
    """Query the Hoisington documents.  Pass the full text specified in the prompt."""
-   return run(text)
+   return await arun(text)
 
 @mcp.tool()
-def documents(text: str) -> str:
-   """Query the Hoisington documents for document names only.  Pass the full text specified in the prompt."""
-   return run(text, titles_only=True)
+async def documents(text: str) -> str:
+   """Query the Hoisington documents for the names of the most relevant documents, best first.  Pass the full text specified in the prompt."""
+   return await arun(text, titles_only=True)
 
 if __name__ == "__main__":
    mcp.run(transport="stdio")
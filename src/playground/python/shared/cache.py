@@ -0,0 +1,260 @@
+import gzip, hashlib, json, os, sqlite3, threading, time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+from .config_loader import load_config, BASE_DIR
+
+class SqliteCache:
+   """
+   Key/blob store in a single SQLite file.  Entries are stamped on every read, and the least recently
+   used ones are evicted once the stored values exceed `max_bytes`.  Safe to share between threads and,
+   through SQLite's locking, between processes.
+   """
+
+   def __init__(self, path: str | Path, max_bytes: int):
+      self.path = Path(path)
+      self.path.parent.mkdir(parents=True, exist_ok=True)
+      self.max_bytes = max_bytes
+      self.hits = self.misses = 0
+      self.lock = threading.Lock()
+
+      self.conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30)
+      self.conn.execute("PRAGMA journal_mode=WAL")
+      self.conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+      self.conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+      self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+   def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+      found: Dict[str, bytes] = {}
+
+      with self.lock:
+         # stay well under SQLite's bound-parameter limit
+         for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            marks = ",".join("?" * len(part))
+            found.update(self.conn.execute(f"SELECT key, value FROM entries WHERE key IN ({marks})", part).fetchall())
+
+            if found:
+               self.conn.execute(f"UPDATE entries SET accessed = ? WHERE key IN ({marks})", [time.time(), *part])
+
+         self.hits += len(found)
+         self.misses += len(set(keys)) - len(found)
+
+      return found
+
+   def get(self, key: str) -> Optional[bytes]:
+      return self.get_many([key]).get(key)
+
+   def contains(self, keys: List[str]) -> Set[str]:
+      """The keys that have an entry, without reading their values (nor counting as hits or misses)."""
+      found: Set[str] = set()
+
+      with self.lock:
+         for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            marks = ",".join("?" * len(part))
+            found.update(k for (k,) in self.conn.execute(f"SELECT key FROM entries WHERE key IN ({marks})", part))
+
+      return found
+
+   def put_many(self, items: Dict[str, bytes]):
+      if not items:
+         return
+
+      now = time.time()
+
+      with self.lock:
+         self.conn.executemany("INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)", [(k, v, len(v), now) for k, v in items.items()])
+         self.size += sum(len(v) for v in items.values())
+
+         if self.size > self.max_bytes:
+            self.evict()
+
+   def put(self, key: str, value: bytes):
+      self.put_many({key: value})
+
+   def evict(self):
+      # other processes may have written since we last looked, so start from the real total
+      self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+      target = int(self.max_bytes * 0.9)
+
+      victims: List[tuple] = []
+
+      for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+         if self.size <= target:
+            break
+
+         victims.append((key,))
+         self.size -= size
+
+      self.conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+
+   def stats(self) -> Dict[str, float]:
+      total = self.hits + self.misses
+      return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 3) if total else 0.0, "bytes": self.size}
+
+class EmbeddingCache(SqliteCache):
+   """Float32 embeddings keyed by a hash of the deployment, model, dimensions and exact input text."""
+
+   def __init__(self, path: str | Path, max_bytes: int, deployment: str, dimensions: int, model: str = ""):
+      super().__init__(path, max_bytes)
+      self.prefix = f"{deployment}:{model}:{dimensions}:" if model else f"{deployment}:{dimensions}:"
+
+   def key(self, text: str) -> str:
+      return hashlib.sha256((self.prefix + text).encode("utf-8")).hexdigest()
+
+   def lookup(self, texts: Iterable[str]) -> Dict[str, List[float]]:
+      keys = {self.key(t): t for t in texts}
+      return {keys[k]: array("f", v).tolist() for k, v in self.get_many(list(keys)).items()}
+
+   def store(self, texts: Iterable[str], vectors: Iterable[List[float]]):
+      self.put_many({self.key(t): array("f", v).tobytes() for t, v in zip(texts, vectors)})
+
+class TextCache(SqliteCache):
+   """Extracted document text, gzip-compressed, keyed by the source file's fingerprint and the extraction engine."""
+
+   def lookup(self, keys: List[str]) -> Dict[str, str]:
+      return {k: gzip.decompress(v).decode("utf-8") for k, v in self.get_many(keys).items()}
+
+   def store(self, key: str, text: str):
+      self.put(key, gzip.compress(text.encode("utf-8"), compresslevel=6))
+
+class QueryCache:
+   """
+   Formatted query results held in memory for `ttl` seconds, with the least recently used dropped past
+   `max_entries`, and optionally mirrored to a `SqliteCache` so they survive restarts.  Keys include the
+   index version, so nothing cached before the ingestion pipeline last wrote to the index is served.
+   """
+
+   def __init__(self, ttl: float, max_entries: int, disk: Optional[SqliteCache] = None):
+      self.ttl = ttl
+      self.max_entries = max_entries
+      self.disk = disk
+      self.entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+      self.hits = self.misses = 0
+      self.lock = threading.Lock()
+
+   def key(self, query: str, **params) -> str:
+      normalized = " ".join(query.casefold().split())
+      material = json.dumps([index_version(), normalized, params], sort_keys=True)
+      return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+   def get(self, key: str) -> Optional[str]:
+      now = time.time()
+
+      with self.lock:
+         entry = self.entries.get(key)
+
+         if entry and entry[0] > now:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+         self.entries.pop(key, None)
+
+      blob = self.disk.get(key) if self.disk else None
+
+      if blob:
+         expires, value = json.loads(blob)
+
+         if expires > now:
+            self.remember(key, expires, value)
+
+            with self.lock:
+               self.hits += 1
+
+            return value
+
+      with self.lock:
+         self.misses += 1
+
+      return None
+
+   def put(self, key: str, value: str):
+      expires = time.time() + self.ttl
+      self.remember(key, expires, value)
+
+      if self.disk:
+         self.disk.put(key, json.dumps([expires, value]).encode("utf-8"))
+
+   def remember(self, key: str, expires: float, value: str):
+      with self.lock:
+         self.entries[key] = (expires, value)
+         self.entries.move_to_end(key)
+
+         while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+   def stats(self) -> Dict[str, float]:
+      total = self.hits + self.misses
+      return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 3) if total else 0.0, "entries": len(self.entries)}
+
+def resolve_path(value: str) -> Path:
+   path = Path(value)
+   return path if path.is_absolute() else BASE_DIR / path
+
+def index_version() -> str:
+   """The token last written by `bump_index_version`, or "" when none has been written or versioning is off."""
+   value = load_config()["INDEX_VERSION_PATH"]
+
+   if not value:
+      return ""
+
+   try:
+      return resolve_path(value).read_text(encoding="utf-8")
+   except FileNotFoundError:
+      return ""
+
+def bump_index_version():
+   """Called after every write to the index so query caches in any process on this machine stop serving older results."""
+   value = load_config()["INDEX_VERSION_PATH"]
+
+   if not value:
+      return
+
+   path = resolve_path(value)
+   path.parent.mkdir(parents=True, exist_ok=True)
+
+   # written aside and renamed so readers never see a partial token
+   tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+   tmp.write_text(str(time.time_ns()), encoding="utf-8")
+   os.replace(tmp, path)
+
+embedding_cache: Optional[EmbeddingCache] = None
+text_cache: Optional[TextCache] = None
+query_cache: Optional[QueryCache] = None
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+   """Returns the process-wide embedding cache, or None when EMBEDDING_CACHE_PATH is set to an empty value."""
+   global embedding_cache
+
+   config = load_config()
+
+   if embedding_cache is None and config["EMBEDDING_CACHE_PATH"]:
+      embedding_cache = EmbeddingCache(resolve_path(config["EMBEDDING_CACHE_PATH"]), config["EMBEDDING_CACHE_MAX_MB"] * 1024 * 1024, config["AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT"], config["AZURE_OPENAI_EMBEDDINGS_DIMENSIONS"], config["AZURE_OPENAI_EMBEDDINGS_MODEL"])
+
+   return embedding_cache
+
+def get_text_cache() -> Optional[TextCache]:
+   """Returns the process-wide extracted-text cache, or None when TEXT_CACHE_PATH is set to an empty value."""
+   global text_cache
+
+   config = load_config()
+
+   if text_cache is None and config["TEXT_CACHE_PATH"]:
+      text_cache = TextCache(resolve_path(config["TEXT_CACHE_PATH"]), config["TEXT_CACHE_MAX_MB"] * 1024 * 1024)
+
+   return text_cache
+
+def get_query_cache() -> Optional[QueryCache]:
+   """Returns the process-wide query result cache, or None when QUERY_CACHE_TTL is 0.  QUERY_CACHE_PATH adds the on-disk copy."""
+   global query_cache
+
+   config = load_config()
+
+   if query_cache is None and config["QUERY_CACHE_TTL"] > 0:
+      disk = SqliteCache(resolve_path(config["QUERY_CACHE_PATH"]), config["QUERY_CACHE_MAX_MB"] * 1024 * 1024) if config["QUERY_CACHE_PATH"] else None
+      query_cache = QueryCache(config["QUERY_CACHE_TTL"], config["QUERY_CACHE_MAX_ENTRIES"], disk)
+
+   return query_cache
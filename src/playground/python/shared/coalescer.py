@@ -0,0 +1,144 @@
+import asyncio, threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+Vectors = List[List[float]]
+
+def checked(texts: List[str], vectors: Vectors) -> Vectors:
+   # a short response would leave some callers waiting on futures that never resolve
+   if len(vectors) != len(texts):
+      raise RuntimeError(f"Embedding count mismatch: {len(vectors)} vectors for {len(texts)} texts")
+
+   return vectors
+
+class Coalescer:
+   """
+   Collects texts submitted from any thread for `window` seconds (or until `max_inputs` are waiting) and
+   embeds them with one `embed(texts)` call.  A text that is already waiting or in flight joins that
+   request instead of starting its own.  Callers wait at most `timeout` seconds for their vector.
+   """
+
+   def __init__(self, embed: Callable[[List[str]], Vectors], window: float = 0.005, max_inputs: int = 16, timeout: float = 300):
+      self.embed_many = embed
+      self.window = window
+      self.max_inputs = max_inputs
+      self.timeout = timeout
+      self.pending: Dict[str, Future] = {}
+      self.inflight: Dict[str, Future] = {}
+      self.timer: Optional[threading.Timer] = None
+      self.requests = self.texts = 0
+      self.lock = threading.Lock()
+
+   def submit(self, text: str) -> Future:
+      full = False
+
+      with self.lock:
+         future = self.pending.get(text) or self.inflight.get(text)
+
+         if future is not None:
+            return future
+
+         future = self.pending[text] = Future()
+         full = len(self.pending) >= self.max_inputs
+
+         if not full and self.timer is None:
+            self.timer = threading.Timer(self.window, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+      if full:
+         self.flush()
+
+      return future
+
+   def embed(self, text: str) -> List[float]:
+      return self.submit(text).result(timeout=self.timeout)
+
+   def flush(self):
+      with self.lock:
+         batch, self.pending = self.pending, {}
+
+         if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+         self.inflight.update(batch)
+
+      if not batch:
+         return
+
+      texts = list(batch)
+
+      try:
+         vectors = checked(texts, self.embed_many(texts))
+         self.requests += 1
+         self.texts += len(texts)
+
+         for text, vector in zip(texts, vectors):
+            batch[text].set_result(vector)
+      except Exception as e:
+         for future in batch.values():
+            if not future.done():
+               future.set_exception(e)
+      finally:
+         with self.lock:
+            for text in texts:
+               self.inflight.pop(text, None)
+
+class AsyncCoalescer:
+   """`Coalescer` for coroutines: texts awaited on one event loop within `window` seconds share one `embed(texts)` call."""
+
+   def __init__(self, embed: Callable[[List[str]], Awaitable[Vectors]], window: float = 0.005, max_inputs: int = 16):
+      self.embed_many = embed
+      self.window = window
+      self.max_inputs = max_inputs
+      self.pending: Dict[str, asyncio.Future] = {}
+      self.inflight: Dict[str, asyncio.Future] = {}
+      self.timer: Optional[asyncio.TimerHandle] = None
+      self.tasks: Set[asyncio.Task] = set()
+      self.requests = self.texts = 0
+
+   async def embed(self, text: str) -> List[float]:
+      future = self.pending.get(text) or self.inflight.get(text)
+
+      if future is None:
+         loop = asyncio.get_running_loop()
+         future = self.pending[text] = loop.create_future()
+
+         if len(self.pending) >= self.max_inputs:
+            self.start_flush()
+         elif self.timer is None:
+            self.timer = loop.call_later(self.window, self.start_flush)
+
+      # a cancelled caller must not cancel the request other callers are waiting on
+      return await asyncio.shield(future)
+
+   def start_flush(self):
+      if self.timer is not None:
+         self.timer.cancel()
+         self.timer = None
+
+      batch, self.pending = self.pending, {}
+      self.inflight.update(batch)
+
+      task = asyncio.get_running_loop().create_task(self.flush(batch))
+      self.tasks.add(task)
+      task.add_done_callback(self.tasks.discard)
+
+   async def flush(self, batch: Dict[str, asyncio.Future]):
+      texts = list(batch)
+
+      try:
+         vectors = checked(texts, await self.embed_many(texts))
+         self.requests += 1
+         self.texts += len(texts)
+
+         for text, vector in zip(texts, vectors):
+            batch[text].set_result(vector)
+      except Exception as e:
+         for future in batch.values():
+            if not future.done():
+               future.set_exception(e)
+      finally:
+         for text in texts:
+            self.inflight.pop(text, None)
@@ -1,6 +1,5 @@
-import os
+import os, sys
 from pathlib import Path
-from dotenv import load_dotenv, find_dotenv
 
 REQUIRED_VARS = [
    "AZURE_SEARCH_ENDPOINT",
@@ -21,6 +20,8 @@ def load_config(env_file: str | None = None) -> dict:
    if (len(config)):
       return config
 
+   from dotenv import load_dotenv
+
    if env_file:
       env_path = Path(env_file)
 
@@ -30,7 +31,8 @@ def load_config(env_file: str | None = None) -> dict:
       load_dotenv(dotenv_path=env_path, override=False)
    
    if (not env_file):
-      print(f"Loading .env from current working directory {dotenv_path}")
+      # on stderr: the MCP server loads the config on its first query, when stdout is its protocol stream
+      print(f"Loading .env from current working directory {dotenv_path}", file=sys.stderr)
       load_dotenv(dotenv_path, override=False)
 
    # Validate required variables
@@ -47,6 +49,35 @@ def load_config(env_file: str | None = None) -> dict:
       "AZURE_OPENAI_API_KEY": os.getenv("AZURE_OPENAI_API_KEY"),
       "AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT": os.getenv("AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT"),
       "AZURE_OPENAI_API_VERSION": os.getenv("AZURE_OPENAI_API_VERSION", "2024-06-01"),
+      "AZURE_OPENAI_EMBEDDINGS_MODEL": os.getenv("AZURE_OPENAI_EMBEDDINGS_MODEL", "text-embedding-ada-002").strip().lower(),
+      "AZURE_OPENAI_EMBEDDINGS_DIMENSIONS": int(os.getenv("AZURE_OPENAI_EMBEDDINGS_DIMENSIONS", "1536")),
+      "AZURE_OPENAI_EMBEDDINGS_TPM": int(os.getenv("AZURE_OPENAI_EMBEDDINGS_TPM", "120000")),
+      "AZURE_OPENAI_EMBEDDINGS_RPM": int(os.getenv("AZURE_OPENAI_EMBEDDINGS_RPM", "720")),
+      "EMBEDDING_WORKERS": int(os.getenv("EMBEDDING_WORKERS", "4")),
+      "EMBEDDING_BATCH_MAX_INPUTS": int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "2048")),
+      "EMBEDDING_BATCH_MAX_TOKENS": int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "32000")),
+      "EMBEDDING_CACHE_PATH": os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite"),
+      "EMBEDDING_CACHE_MAX_MB": int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512")),
+      "TEXT_CACHE_PATH": os.getenv("TEXT_CACHE_PATH", ".cache/text.sqlite"),
+      "TEXT_CACHE_MAX_MB": int(os.getenv("TEXT_CACHE_MAX_MB", "256")),
+      "QUERY_EMBEDDING_WINDOW_MS": float(os.getenv("QUERY_EMBEDDING_WINDOW_MS", "5")),
+      "QUERY_EMBEDDING_MAX_INPUTS": int(os.getenv("QUERY_EMBEDDING_MAX_INPUTS", "16")),
+      "DOCUMENTS_K": int(os.getenv("DOCUMENTS_K", "10")),
+      "DOCUMENTS_TOP": int(os.getenv("DOCUMENTS_TOP", "10")),
+      "QUERY_CACHE_TTL": float(os.getenv("QUERY_CACHE_TTL", "300")),
+      "QUERY_CACHE_MAX_ENTRIES": int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1024")),
+      "QUERY_CACHE_PATH": os.getenv("QUERY_CACHE_PATH", ""),
+      "QUERY_CACHE_MAX_MB": int(os.getenv("QUERY_CACHE_MAX_MB", "64")),
+      "INDEX_VERSION_PATH": os.getenv("INDEX_VERSION_PATH", ".cache/index-version"),
+      "SEARCH_BACKEND": os.getenv("SEARCH_BACKEND", "azure").lower(),
+      "LOCAL_INDEX_PATH": os.getenv("LOCAL_INDEX_PATH", ".cache/local-index"),
+      "HTTP_POOL_MAXSIZE": int(os.getenv("HTTP_POOL_MAXSIZE", "32")),
+      "HTTP_KEEPALIVE_SECONDS": float(os.getenv("HTTP_KEEPALIVE_SECONDS", "30")),
+      "HTTP_CONNECT_TIMEOUT": float(os.getenv("HTTP_CONNECT_TIMEOUT", "10")),
+      "HTTP_READ_TIMEOUT": float(os.getenv("HTTP_READ_TIMEOUT", "120")),
+      "HTTP2": os.getenv("HTTP2", "false").lower() in ("1", "true", "yes"),
+      "UPLOAD_WORKERS": int(os.getenv("UPLOAD_WORKERS", "4")),
+      "UPLOAD_MAX_MB": int(os.getenv("UPLOAD_MAX_MB", "8")),
       "MAX_CHARS": int(os.getenv("MAX_CHARS", "1200")),
       "OVERLAP": int(os.getenv("OVERLAP", "200"))
    }
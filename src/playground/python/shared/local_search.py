@@ -0,0 +1,172 @@
+import json, math, os, re, shutil, threading, time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from .config_loader import load_config
+from .cache import resolve_path, bump_index_version
+
+# the same constants as the service: BM25Similarity's defaults and the k used by its reciprocal rank fusion
+BM25_K1, BM25_B, RRF_K = 1.2, 0.75, 60
+
+# the fields `run` formats; text_vector goes to the matrix instead
+FIELDS = ["chunk_id", "parent_id", "title", "chunk", "meta_data"]
+
+def tokenize(text: str) -> List[str]:
+   # close to the standard analyzer the index uses: lowercased word characters, no stemming or stop words
+   return re.findall(r"\w+", text.lower())
+
+class LocalIndex:
+   """
+   A read-only replica of the search index held in this process: chunk vectors in a memory-mapped float32
+   matrix searched by exact cosine similarity, chunk text in a BM25 inverted index, with the two rankings
+   merged by reciprocal rank fusion like the service's hybrid queries.  Built by `write_local_index`.
+   """
+
+   def __init__(self, directory: str | Path):
+      self.directory = Path(directory)
+
+      with open(self.directory / "documents.jsonl", encoding="utf-8") as f:
+         self.documents = [json.loads(line) for line in f]
+
+      # rows are normalized when written, so a dot product is the cosine similarity
+      self.vectors = np.load(self.directory / "vectors.npy", mmap_mode="r")
+
+      if len(self.vectors) != len(self.documents):
+         raise RuntimeError(f"Local index at {self.directory} has {len(self.vectors)} vectors for {len(self.documents)} documents; export it again.")
+
+      postings: Dict[str, Dict[int, int]] = {}
+      lengths = []
+
+      for row, doc in enumerate(self.documents):
+         terms = Counter(tokenize(f"{doc.get('title') or ''} {doc.get('chunk') or ''}"))
+         lengths.append(sum(terms.values()))
+
+         for term, count in terms.items():
+            postings.setdefault(term, {})[row] = count
+
+      self.lengths = np.asarray(lengths, dtype=np.float32)
+      self.average_length = float(self.lengths.mean()) if len(lengths) else 0.0
+      self.postings = {term: (np.fromiter(rows.keys(), dtype=np.int32, count=len(rows)), np.fromiter(rows.values(), dtype=np.float32, count=len(rows))) for term, rows in postings.items()}
+
+   def vector_ranking(self, vector: List[float], k: int) -> np.ndarray:
+      query = np.asarray(vector, dtype=np.float32)
+      scores = self.vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+      return top_k(scores, k)
+
+   def keyword_ranking(self, text: str, k: int) -> np.ndarray:
+      scores = np.zeros(len(self.documents), dtype=np.float32)
+
+      for term in set(tokenize(text)):
+         if term not in self.postings:
+            continue
+
+         rows, counts = self.postings[term]
+         idf = math.log(1 + (len(self.documents) - len(rows) + 0.5) / (len(rows) + 0.5))
+         norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[rows] / self.average_length)
+         scores[rows] += idf * counts * (BM25_K1 + 1) / (counts + norm)
+
+      # chunks without any of the terms are not keyword matches at all
+      return top_k(scores, min(k, int(np.count_nonzero(scores))))
+
+   def search(self, text: str, vector: List[float], k: int, top: int) -> List[dict]:
+      """The `top` chunks by fused rank of the `k` nearest vectors and the `top` best keyword matches, shaped like the service's results."""
+      fused: Dict[int, float] = {}
+
+      for ranking in (self.vector_ranking(vector, k), self.keyword_ranking(text, top)):
+         for rank, row in enumerate(ranking.tolist(), start=1):
+            fused[row] = fused.get(row, 0.0) + 1 / (RRF_K + rank)
+
+      best = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top]
+      # no semantic ranker runs locally, so there is no reranker score
+      return [{**self.documents[row], "@search.score": score, "@search.reranker_score": None} for row, score in best]
+
+   def stats(self) -> Dict[str, float]:
+      return {"documents": len(self.documents), "terms": len(self.postings), "vectors_mb": round(self.vectors.nbytes / 1e6, 1)}
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+   if k <= 0:
+      return np.empty(0, dtype=np.int64)
+
+   if k < len(scores):
+      rows = np.argpartition(-scores, k - 1)[:k]
+   else:
+      rows = np.arange(len(scores))
+
+   return rows[np.argsort(-scores[rows], kind="stable")]
+
+def local_index_path() -> Path:
+   return resolve_path(load_config()["LOCAL_INDEX_PATH"])
+
+def write_local_index(documents: Iterable[dict], directory: Optional[str | Path] = None) -> int:
+   """
+   Writes documents with the index's fields (text_vector included) as a local replica and returns how many
+   were written.  Each replica goes to a new version directory and becomes current when the CURRENT pointer
+   is swapped to it, so running processes never load the documents of one version with the vectors of
+   another, and pick up the new copy on their next query.  The index version is bumped as well.
+   """
+   root = Path(directory) if directory else local_index_path()
+   version = str(time.time_ns())
+   target = root / version
+   target.mkdir(parents=True)
+   vectors = []
+
+   try:
+      with open(target / "documents.jsonl", "w", encoding="utf-8") as f:
+         for doc in documents:
+            if not doc.get("text_vector"):
+               raise RuntimeError(f"Document '{doc.get('chunk_id')}' has no text_vector; the vector field must be retrievable (VECTOR_STORED=true) to export it.")
+
+            vectors.append(doc["text_vector"])
+            f.write(json.dumps({field: doc.get(field) for field in FIELDS}, ensure_ascii=False) + "\n")
+
+      matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+      matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+      np.save(target / "vectors.npy", matrix)
+   except BaseException:
+      shutil.rmtree(target, ignore_errors=True)
+      raise
+
+   previous = current_version(root)
+   tmp = root / f"CURRENT.{os.getpid()}.tmp"
+   tmp.write_text(version, encoding="utf-8")
+   os.replace(tmp, root / "CURRENT")
+   bump_index_version()
+
+   # the previous version may still be loading or mapped by other processes; anything older is removed
+   # (on Windows a version still mapped somewhere cannot be, and is left for the next export)
+   for old in root.iterdir():
+      if old.is_dir() and old.name not in (version, previous):
+         shutil.rmtree(old, ignore_errors=True)
+
+   return len(vectors)
+
+def current_version(root: Path) -> str:
+   try:
+      return (root / "CURRENT").read_text(encoding="utf-8").strip()
+   except FileNotFoundError:
+      return ""
+
+local_index: Optional[LocalIndex] = None
+local_index_version = None
+local_index_lock = threading.Lock()
+
+def get_local_index() -> LocalIndex:
+   """
+   Returns the process-wide local replica, reloaded when `write_local_index` has made another version
+   current.  Loading builds the BM25 index, which takes a while on a large replica, so call it off the
+   event loop.
+   """
+   global local_index, local_index_version
+
+   root = local_index_path()
+   version = current_version(root)
+
+   if not version:
+      raise RuntimeError(f"No local index at {root}.  Run indexer/export.py first, or set SEARCH_BACKEND=azure.")
+
+   with local_index_lock:
+      if local_index is None or version != local_index_version:
+         local_index, local_index_version = LocalIndex(root / version), version
+
+      return local_index
@@ -1,64 +1,264 @@
 
-import json, sys
-from pathlib import Path
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from azure.search.documents.indexes import SearchIndexClient
-from azure.search.documents.indexes.models import SearchIndex
-from openai import AzureOpenAI
-from azure.identity import DefaultAzureCredential, get_bearer_token_provider
-from azure.search.documents.models import VectorizedQuery
+import asyncio, json, sys, threading
+from typing import TYPE_CHECKING, Callable
 from .config_loader import load_config
+from .cache import get_embedding_cache, get_query_cache
+from .coalescer import Coalescer, AsyncCoalescer
+from .transport import get_transport, get_async_transport, get_http_client, get_async_http_client
 
-config = load_config()
+if TYPE_CHECKING:
+   from azure.search.documents import SearchClient
+   from azure.search.documents.indexes import SearchIndexClient
+   from azure.search.documents.aio import SearchClient as AsyncSearchClient
+   from openai import AzureOpenAI, AsyncAzureOpenAI
 
-SEARCH_ENDPOINT, SEARCH_INDEX, SEARCH_API_KEY = config['AZURE_SEARCH_ENDPOINT'], config['AZURE_SEARCH_INDEX'], config['AZURE_SEARCH_API_KEY']
-AOAI_ENDPOINT, AOAI_API_KEY, AOAI_EMBED_DEPLOYMENT, AOAI_API_VERSION = config['AZURE_OPENAI_ENDPOINT'], config['AZURE_OPENAI_API_KEY'], config['AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT'], config['AZURE_OPENAI_API_VERSION']
-SEMANTIC_CONFIG = f"{SEARCH_INDEX}-semantic-configuration"
+K_NEAREST, TOP = 50, 50
 
-credential = AzureKeyCredential(SEARCH_API_KEY)
-search_client = SearchClient(SEARCH_ENDPOINT, SEARCH_INDEX, credential)
-index_client = SearchIndexClient(SEARCH_ENDPOINT, credential)
+# clients, and the SDKs behind them, are built on first use so importing this module (and starting the MCP server) stays cheap
+clients: dict = {}
+# reentrant, because building one client can build another (e.g. the Entra ID token provider)
+clients_lock = threading.RLock()
 
-token_provider = get_bearer_token_provider(DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default")
-key_credential = AzureKeyCredential(AOAI_API_KEY)
+def memoized(name: str, build: Callable):
+   if name not in clients:
+      with clients_lock:
+         if name not in clients:
+            clients[name] = build()
 
-# client = AzureOpenAI(azure_endpoint=AOAI_ENDPOINT, azure_ad_token_provider=token_provider, api_version=AOAI_API_VERSION)
-client = AzureOpenAI(azure_endpoint=AOAI_ENDPOINT, api_key=AOAI_API_KEY, api_version=AOAI_API_VERSION)
+   return clients[name]
+
+def semantic_config() -> str:
+   return f"{load_config()['AZURE_SEARCH_INDEX']}-semantic-configuration"
+
+def search_credential():
+   from azure.core.credentials import AzureKeyCredential
+   return AzureKeyCredential(load_config()['AZURE_SEARCH_API_KEY'])
+
+def get_search_client() -> "SearchClient":
+   def build():
+      from azure.search.documents import SearchClient
+      config = load_config()
+      return SearchClient(config['AZURE_SEARCH_ENDPOINT'], config['AZURE_SEARCH_INDEX'], search_credential(), transport=get_transport())
+
+   return memoized("search", build)
+
+def get_index_client() -> "SearchIndexClient":
+   def build():
+      from azure.search.documents.indexes import SearchIndexClient
+      return SearchIndexClient(load_config()['AZURE_SEARCH_ENDPOINT'], search_credential(), transport=get_transport())
+
+   return memoized("index", build)
+
+def get_token_provider():
+   """Entra ID bearer tokens for Azure OpenAI; only needed when authenticating without the API key."""
+   def build():
+      from azure.identity import DefaultAzureCredential, get_bearer_token_provider
+      return get_bearer_token_provider(DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default")
+
+   return memoized("token_provider", build)
+
+def get_client() -> "AzureOpenAI":
+   def build():
+      from openai import AzureOpenAI
+      config = load_config()
+      # return AzureOpenAI(azure_endpoint=config['AZURE_OPENAI_ENDPOINT'], azure_ad_token_provider=get_token_provider(), api_version=config['AZURE_OPENAI_API_VERSION'], http_client=get_http_client())
+      return AzureOpenAI(azure_endpoint=config['AZURE_OPENAI_ENDPOINT'], api_key=config['AZURE_OPENAI_API_KEY'], api_version=config['AZURE_OPENAI_API_VERSION'], http_client=get_http_client())
+
+   return memoized("openai", build)
+
+def embed_window() -> float:
+   # concurrent queries arriving within this window share one embeddings request (0 sends each on its own)
+   return load_config()['QUERY_EMBEDDING_WINDOW_MS'] / 1000
+
+def embedding_options() -> dict:
+   """
+   Arguments for every embeddings call, so the indexer's and the queries' vectors match the index's field.
+   `dimensions` is sent to every model but ada-002, which rejects it; text-embedding-3 models return their
+   full size (3072 for -large) without it, even when the index is 1536 wide.
+   """
+   config = load_config()
+   options = {"model": config['AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT']}
+
+   if config['AZURE_OPENAI_EMBEDDINGS_MODEL'] != "text-embedding-ada-002" or config['AZURE_OPENAI_EMBEDDINGS_DIMENSIONS'] != 1536:
+      options["dimensions"] = config['AZURE_OPENAI_EMBEDDINGS_DIMENSIONS']
+
+   return options
+
+def embed_texts(texts: list[str]) -> list[list[float]]:
+    response = get_client().embeddings.create(input=texts, **embedding_options())
+    return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+def get_coalescer() -> Coalescer | None:
+   return memoized("coalescer", lambda: Coalescer(embed_texts, embed_window(), load_config()['QUERY_EMBEDDING_MAX_INPUTS']) if embed_window() > 0 else None)
 
 def get_embedding(text):
-    return client.embeddings.create(input=text, model=AOAI_EMBED_DEPLOYMENT).data[0].embedding
+    cache = get_embedding_cache()
+    vector = cache.lookup([text]).get(text) if cache else None
 
-def run(search_query: str, titles_only = False) -> str:
-   search_vector = get_embedding(search_query)
-   v = VectorizedQuery(vector=search_vector, k_nearest_neighbors=50, fields="text_vector")
+    if vector is None:
+        coalescer = get_coalescer()
+        vector = coalescer.embed(text) if coalescer else embed_texts([text])[0]
+
+        if cache:
+            cache.store([text], [vector])
+
+    return vector
+
+# the async clients also wait for first use so they bind to the event loop that serves the queries
+def get_async_clients() -> tuple["AsyncSearchClient", "AsyncAzureOpenAI"]:
+   def build():
+      from azure.search.documents.aio import SearchClient as AsyncSearchClient
+      from openai import AsyncAzureOpenAI
+      config = load_config()
+
+      return (
+         AsyncSearchClient(config['AZURE_SEARCH_ENDPOINT'], config['AZURE_SEARCH_INDEX'], search_credential(), transport=get_async_transport()),
+         AsyncAzureOpenAI(azure_endpoint=config['AZURE_OPENAI_ENDPOINT'], api_key=config['AZURE_OPENAI_API_KEY'], api_version=config['AZURE_OPENAI_API_VERSION'], http_client=get_async_http_client()))
+
+   return memoized("async", build)
+
+def get_async_coalescer() -> AsyncCoalescer | None:
+   return memoized("async_coalescer", lambda: AsyncCoalescer(aembed_texts, embed_window(), load_config()['QUERY_EMBEDDING_MAX_INPUTS']) if embed_window() > 0 else None)
+
+async def aembed_texts(texts: list[str]) -> list[list[float]]:
+   _, aoai_client = get_async_clients()
+   response = await aoai_client.embeddings.create(input=texts, **embedding_options())
+   return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+async def aget_embedding(text):
+   # the SQLite cache can wait up to its busy timeout while an ingestion run writes to it, so it is used off the loop
+   cache = await asyncio.to_thread(get_embedding_cache)
+   vector = (await asyncio.to_thread(cache.lookup, [text])).get(text) if cache else None
+
+   if vector is None:
+      async_coalescer = get_async_coalescer()
+      vector = await async_coalescer.embed(text) if async_coalescer else (await aembed_texts([text]))[0]
+
+      if cache:
+         await asyncio.to_thread(cache.store, [text], [vector])
+
+   return vector
+
+def depth(titles_only: bool) -> tuple[int, int]:
+   # the `documents` listing only needs enough chunks to name the best few documents
+   config = load_config()
+   return (config['DOCUMENTS_K'], config['DOCUMENTS_TOP']) if titles_only else (K_NEAREST, TOP)
 
-   r = search_client.search(
-      search_query,
-      top=50, 
+def search_args(search_query: str, search_vector, titles_only = False) -> dict:
+   from azure.search.documents.models import VectorizedQuery
+
+   k, top = depth(titles_only)
+   v = VectorizedQuery(vector=search_vector, k_nearest_neighbors=k, fields="text_vector")
+
+   args = dict(
+      search_text=search_query,
+      top=top, 
       vector_queries=[v],
       query_type="semantic",
-      semantic_configuration_name=SEMANTIC_CONFIG)
+      semantic_configuration_name=semantic_config())
+
+   if titles_only:
+      # only the fields needed to name and group documents come back, not the chunk text
+      args["select"] = ["title", "parent_id"]
+
+   return args
+
+def search_backend() -> str:
+   # "azure" queries the service; "local" queries the in-process replica written by indexer/export.py
+   return load_config()['SEARCH_BACKEND']
+
+def cache_key(search_query: str, titles_only: bool) -> str | None:
+   cache = get_query_cache()
+   k, top = depth(titles_only)
+   return cache.key(search_query, backend=search_backend(), index=load_config()['AZURE_SEARCH_INDEX'], semantic=semantic_config(), k=k, top=top, titles_only=titles_only) if cache else None
+
+def local_search(search_query: str, search_vector, titles_only = False) -> list:
+   from .local_search import get_local_index
+   return get_local_index().search(search_query, search_vector, *depth(titles_only))
+
+def search_documents(search_query: str, titles_only = False, backend: str | None = None) -> list:
+   """The unformatted results of a query against `backend` (SEARCH_BACKEND by default)."""
+   if (backend or search_backend()) == "local":
+      return local_search(search_query, get_embedding(search_query), titles_only)
+
+   return list(get_search_client().search(**search_args(search_query, get_embedding(search_query), titles_only)))
+
+def run(search_query: str, titles_only = False) -> str:
+   cache, key = get_query_cache(), cache_key(search_query, titles_only)
+   cached = cache.get(key) if cache else None
+
+   if cached is not None:
+      return cached
+
+   results = format_results(search_documents(search_query, titles_only), titles_only)
+
+   if cache:
+      cache.put(key, results)
+
+   return results
 
-   fr = [doc for doc in r if doc['@search.reranker_score'] > 1]
+async def arun(search_query: str, titles_only = False) -> str:
+   """Same as `run`, without blocking the event loop on the embedding or search round trips, or on the caches' file I/O."""
+   # the key reads the index version file, and the query cache may be backed by SQLite
+   cache, key = await asyncio.to_thread(get_query_cache), await asyncio.to_thread(cache_key, search_query, titles_only)
+   cached = await asyncio.to_thread(cache.get, key) if cache else None
 
+   if cached is not None:
+      return cached
+
+   if search_backend() == "local":
+      # a query is milliseconds of NumPy work, but (re)loading the replica builds its BM25 index, so neither blocks the loop
+      docs = await asyncio.to_thread(local_search, search_query, await aget_embedding(search_query), titles_only)
+   else:
+      asearch_client, _ = get_async_clients()
+      r = await asearch_client.search(**search_args(search_query, await aget_embedding(search_query), titles_only))
+      docs = [doc async for doc in r]
+
+   results = format_results(docs, titles_only)
+
+   if cache:
+      await asyncio.to_thread(cache.put, key, results)
+
+   return results
+
+def score(doc) -> float:
+   # results from the local backend are not reranked, so their fused score stands in for the reranker's
+   reranker_score = doc['@search.reranker_score']
+   return reranker_score if reranker_score is not None else doc['@search.score']
+
+def relevant(docs: list) -> list:
+   # only reranked results are cut at the reranker's "somewhat relevant" mark
+   return [doc for doc in docs if doc['@search.reranker_score'] is None or doc['@search.reranker_score'] > 1]
+
+def format_documents(docs: list) -> str:
+   """One entry per source document: its best reranker score and how many of its chunks matched, best first."""
+   groups = {}
+
+   for doc in relevant(docs):
+      group = groups.setdefault(doc.get('parent_id') or doc['title'], {"title": doc['title'].replace("\n", " "), "reranker_score": 0, "chunks": 0})
+      group["reranker_score"] = max(group["reranker_score"], score(doc))
+      group["chunks"] += 1
+
+   results = sorted(groups.values(), key=lambda g: (g["reranker_score"], g["chunks"]), reverse=True)
+   return json.dumps(results, indent=2)
+
+def format_results(docs: list, titles_only = False) -> str:
+   if titles_only:
+      return format_documents(docs)
+
+   fr = relevant(docs)
+
+   # stdout carries the MCP server's stdio protocol, so diagnostics go to stderr
    for doc in fr:
       content = doc["chunk"].replace("\n", " ")
-      print(f"score: {doc['@search.score']}, reranker: {doc['@search.reranker_score']}. {content}")
+      print(f"score: {doc['@search.score']}, reranker: {doc['@search.reranker_score']}. {content}", file=sys.stderr)
 
    results = []
 
    for doc in fr:
-      if titles_only:
-         results.append({
-            "title": doc['title'].replace("\n", " ")
-         })
-
-         continue
-
       results.append({
          "title": doc['title'].replace("\n", " "),
-         "reranker_score": doc['@search.reranker_score'],
+         "reranker_score": score(doc),
          "content": doc["chunk"].replace("\n", " "),
          "metadata": doc["meta_data"].replace("\n", " "),
       })
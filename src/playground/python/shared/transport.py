@@ -0,0 +1,146 @@
+import threading
+from typing import Dict
+from .config_loader import load_config
+
+class TransportMetrics:
+   """
+   Requests sent and new connections opened per client family (azure, azure_async, openai, openai_async);
+   every request beyond the connections opened went over a kept-alive one.
+   """
+
+   def __init__(self):
+      self.counts: Dict[str, Dict[str, int]] = {}
+      self.lock = threading.Lock()
+
+   def record(self, stack: str, requests: int = 0, connections: int = 0):
+      with self.lock:
+         counts = self.counts.setdefault(stack, {"requests": 0, "connections": 0})
+         counts["requests"] += requests
+         counts["connections"] += connections
+
+   def stats(self) -> Dict[str, Dict[str, float]]:
+      with self.lock:
+         counts = {stack: dict(c) for stack, c in self.counts.items()}
+
+      # urllib3 keeps its own counters, so the requests session is read rather than recorded
+      if "session" in shared:
+         counts["azure"] = {"requests": 0, "connections": 0}
+
+         for key in list(shared["session"].adapters["https://"].poolmanager.pools.keys()):
+            pool = shared["session"].adapters["https://"].poolmanager.pools.get(key)
+
+            if pool is not None:
+               counts["azure"]["requests"] += pool.num_requests
+               counts["azure"]["connections"] += pool.num_connections
+
+      for c in counts.values():
+         c["reuse_rate"] = round(1 - c["connections"] / c["requests"], 3) if c["requests"] else 0.0
+
+      return counts
+
+metrics = TransportMetrics()
+
+# one pool per HTTP stack for the whole process, shared by every client built through this module
+shared: dict = {}
+shared_lock = threading.Lock()
+
+def pool_size() -> int:
+   return load_config()["HTTP_POOL_MAXSIZE"]
+
+def get_session():
+   """The `requests` session behind every synchronous Azure SDK client (SearchClient, SearchIndexClient)."""
+   with shared_lock:
+      if "session" not in shared:
+         import requests
+         from requests.adapters import HTTPAdapter
+
+         session = requests.Session()
+         # retries stay with the SDK pipelines; pool_block makes extra threads wait for a free connection instead of opening throwaway ones
+         adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size(), max_retries=0, pool_block=True)
+         session.mount("https://", adapter)
+         session.mount("http://", adapter)
+         shared["session"] = session
+
+      return shared["session"]
+
+def get_transport():
+   """An azure-core transport over the shared session; each client gets its own, none of them owns the session."""
+   from azure.core.pipeline.transport import RequestsTransport
+
+   config = load_config()
+   return RequestsTransport(session=get_session(), session_owner=False, connection_timeout=config["HTTP_CONNECT_TIMEOUT"], read_timeout=config["HTTP_READ_TIMEOUT"])
+
+def httpx_options(trace) -> dict:
+   import httpx
+
+   config = load_config()
+
+   return dict(
+      limits=httpx.Limits(max_connections=pool_size(), max_keepalive_connections=pool_size(), keepalive_expiry=config["HTTP_KEEPALIVE_SECONDS"]),
+      timeout=httpx.Timeout(config["HTTP_READ_TIMEOUT"], connect=config["HTTP_CONNECT_TIMEOUT"]),
+      # HTTP/2 needs the h2 package (pip install httpx[http2])
+      http2=config["HTTP2"],
+      event_hooks={"request": [trace]})
+
+def get_http_client():
+   """The httpx client behind every synchronous OpenAI client."""
+   with shared_lock:
+      if "httpx" not in shared:
+         import httpx
+
+         def connected(event: str, info: dict):
+            if event == "connection.connect_tcp.complete":
+               metrics.record("openai", connections=1)
+
+         def trace(request):
+            metrics.record("openai", requests=1)
+            request.extensions["trace"] = connected
+
+         shared["httpx"] = httpx.Client(**httpx_options(trace))
+
+      return shared["httpx"]
+
+def get_async_http_client():
+   """The httpx client behind the async OpenAI client; create it from the event loop that will use it."""
+   with shared_lock:
+      if "async_httpx" not in shared:
+         import httpx
+
+         async def connected(event: str, info: dict):
+            if event == "connection.connect_tcp.complete":
+               metrics.record("openai_async", connections=1)
+
+         async def trace(request):
+            metrics.record("openai_async", requests=1)
+            request.extensions["trace"] = connected
+
+         shared["async_httpx"] = httpx.AsyncClient(**httpx_options(trace))
+
+      return shared["async_httpx"]
+
+def get_async_transport():
+   """An azure-core aiohttp transport over one shared session; create it from the event loop that will use it."""
+   import aiohttp
+   from azure.core.pipeline.transport import AioHttpTransport
+
+   config = load_config()
+
+   with shared_lock:
+      if "aiohttp" not in shared:
+         async def request_start(session, context, params):
+            metrics.record("azure_async", requests=1)
+
+         async def connection_created(session, context, params):
+            metrics.record("azure_async", connections=1)
+
+         tracing = aiohttp.TraceConfig()
+         tracing.on_request_start.append(request_start)
+         tracing.on_connection_create_end.append(connection_created)
+
+         connector = aiohttp.TCPConnector(limit=pool_size(), keepalive_timeout=config["HTTP_KEEPALIVE_SECONDS"])
+         shared["aiohttp"] = aiohttp.ClientSession(connector=connector, trace_configs=[tracing])
+
+   return AioHttpTransport(session=shared["aiohttp"], session_owner=False, connection_timeout=config["HTTP_CONNECT_TIMEOUT"], read_timeout=config["HTTP_READ_TIMEOUT"])
+
+def transport_stats() -> Dict[str, Dict[str, float]]:
+   return metrics.stats()
@@ -0,0 +1,23 @@
+import os, sys, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# the indexer modules import each other by bare name, the way indexer/main.py runs them
+sys.path[:0] = [str(ROOT), str(ROOT / "indexer")]
+
+# load_config insists on the Azure settings; none of the tests reach the services, so placeholders will do
+os.environ.setdefault("AZURE_SEARCH_ENDPOINT", "https://example.search.windows.net")
+os.environ.setdefault("AZURE_SEARCH_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT", "text-embedding-3-small")
+
+# nothing a test writes may land in shared/.cache: the caches are off, and the index version and local
+# replica live in a scratch directory
+scratch = Path(tempfile.mkdtemp(prefix="playground-tests-"))
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+os.environ["TEXT_CACHE_PATH"] = ""
+os.environ["QUERY_CACHE_PATH"] = ""
+os.environ["INDEX_VERSION_PATH"] = str(scratch / "index-version")
+os.environ["LOCAL_INDEX_PATH"] = str(scratch / "local-index")
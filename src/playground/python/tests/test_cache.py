@@ -0,0 +1,100 @@
+import pytest
+import shared.cache
+from shared.cache import EmbeddingCache, QueryCache, SqliteCache, bump_index_version
+
+class Clock:
+   def __init__(self):
+      self.now = 1000.0
+
+   def time(self) -> float:
+      return self.now
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+   clock = Clock()
+   monkeypatch.setattr(shared.cache, "time", clock)
+   return clock
+
+def test_values_round_trip_and_are_counted(tmp_path):
+   cache = SqliteCache(tmp_path / "cache.sqlite", max_bytes=1024)
+   cache.put_many({"a": b"1", "b": b"22"})
+
+   assert cache.get_many(["a", "b", "c"]) == {"a": b"1", "b": b"22"}
+   assert cache.get("c") is None
+   assert cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5, "bytes": 3}
+
+def test_least_recently_used_entries_are_evicted_to_below_the_limit(tmp_path, clock):
+   cache = SqliteCache(tmp_path / "cache.sqlite", max_bytes=100)
+
+   for key in "abc":
+      clock.now += 1
+      cache.put(key, b"x" * 30)
+
+   # reading "a" makes "b" the least recently used
+   clock.now += 1
+   cache.get("a")
+   clock.now += 1
+   cache.put("d", b"x" * 30)
+
+   assert sorted(cache.get_many(list("abcd"))) == ["a", "c", "d"]
+   assert cache.size == 90
+
+def test_entries_survive_reopening(tmp_path):
+   SqliteCache(tmp_path / "cache.sqlite", max_bytes=1024).put("a", b"value")
+   reopened = SqliteCache(tmp_path / "cache.sqlite", max_bytes=1024)
+
+   assert reopened.get("a") == b"value" and reopened.size == 5
+
+def test_embeddings_are_keyed_by_deployment_and_dimensions(tmp_path):
+   small = EmbeddingCache(tmp_path / "cache.sqlite", 1024, "text-embedding-3-small", 3)
+   small.store(["text"], [[0.5, -1.0, 2.0]])
+
+   assert small.lookup(["text", "other"]) == {"text": [0.5, -1.0, 2.0]}
+   assert EmbeddingCache(tmp_path / "cache.sqlite", 1024, "text-embedding-3-large", 3).lookup(["text"]) == {}
+
+def test_query_results_expire_after_the_ttl(clock):
+   cache = QueryCache(ttl=60, max_entries=10)
+   cache.put("k", "results")
+
+   clock.now += 59
+   assert cache.get("k") == "results"
+   clock.now += 2
+   assert cache.get("k") is None
+   assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 0}
+
+def test_query_results_past_max_entries_drop_the_least_recently_used(clock):
+   cache = QueryCache(ttl=60, max_entries=2)
+   cache.put("a", "1")
+   cache.put("b", "2")
+   cache.get("a")
+   cache.put("c", "3")
+
+   assert [cache.get(k) for k in "abc"] == ["1", None, "3"]
+
+def test_query_results_are_read_back_from_disk_until_they_expire(tmp_path, clock):
+   disk = SqliteCache(tmp_path / "queries.sqlite", max_bytes=1024)
+   QueryCache(ttl=60, max_entries=10, disk=disk).put("k", "results")
+
+   # a new process starts with nothing in memory
+   restarted = QueryCache(ttl=60, max_entries=10, disk=disk)
+   assert restarted.get("k") == "results"
+
+   clock.now += 61
+   assert QueryCache(ttl=60, max_entries=10, disk=disk).get("k") is None
+
+def test_query_keys_normalize_the_text_and_change_with_the_index_version():
+   cache = QueryCache(ttl=60, max_entries=10)
+   key = cache.key("  Inflation   OUTLOOK ", top=10)
+
+   assert key == cache.key("inflation outlook", top=10)
+   assert key != cache.key("inflation outlook", top=5)
+
+   bump_index_version()
+   assert key != cache.key("inflation outlook", top=10)
+
+def test_contains_reports_keys_without_counting_them(tmp_path):
+   cache = SqliteCache(tmp_path / "cache.sqlite", max_bytes=1024)
+   cache.put_many({"a": b"1", "b": b"2"})
+
+   assert cache.contains(["a", "c", "b"]) == {"a", "b"}
+   assert cache.stats()["hits"] == 0 and cache.stats()["misses"] == 0
@@ -0,0 +1,97 @@
+import asyncio, threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from shared.coalescer import AsyncCoalescer, Coalescer
+
+def vectors_for(texts):
+   return [[float(len(t))] for t in texts]
+
+class Recorder:
+   def __init__(self, embed=vectors_for):
+      self.calls, self.embed = [], embed
+      self.lock = threading.Lock()
+
+   def __call__(self, texts):
+      with self.lock:
+         self.calls.append(list(texts))
+
+      return self.embed(texts)
+
+def test_concurrent_texts_share_one_request():
+   embed = Recorder()
+   coalescer = Coalescer(embed, window=0.2, max_inputs=100)
+   texts = ["a", "bb", "ccc", "bb"]
+
+   with ThreadPoolExecutor(len(texts)) as pool:
+      results = list(pool.map(coalescer.embed, texts))
+
+   assert results == [[1.0], [2.0], [3.0], [2.0]]
+   # the repeated text is sent once
+   assert len(embed.calls) == 1 and sorted(embed.calls[0]) == ["a", "bb", "ccc"]
+
+def test_a_full_batch_is_sent_without_waiting_for_the_window():
+   embed = Recorder()
+   coalescer = Coalescer(embed, window=60, max_inputs=2)
+   first = coalescer.submit("a")
+   second = coalescer.submit("b")
+
+   assert first.result(timeout=1) == [1.0] and second.result(timeout=1) == [1.0]
+   assert embed.calls == [["a", "b"]]
+
+@pytest.mark.parametrize("embed", [lambda texts: vectors_for(texts)[:-1], lambda texts: vectors_for(texts) + [[0.0]]])
+def test_a_count_mismatch_fails_every_waiter(embed):
+   coalescer = Coalescer(embed, window=60, max_inputs=3)
+   futures = [coalescer.submit(t) for t in "abc"]
+
+   for future in futures:
+      with pytest.raises(RuntimeError, match="count mismatch"):
+         future.result(timeout=1)
+
+   # nothing is left in flight, so the texts can be retried
+   assert coalescer.pending == {} and coalescer.inflight == {}
+
+def test_an_error_fails_every_waiter():
+   def embed(texts):
+      raise ValueError("throttled")
+
+   coalescer = Coalescer(embed, window=60, max_inputs=2)
+   futures = [coalescer.submit(t) for t in "ab"]
+
+   for future in futures:
+      with pytest.raises(ValueError):
+         future.result(timeout=1)
+
+def test_embed_gives_up_after_the_timeout():
+   release = threading.Event()
+   coalescer = Coalescer(lambda texts: release.wait(5) and vectors_for(texts), window=0.001, max_inputs=100, timeout=0.05)
+
+   try:
+      with pytest.raises(TimeoutError):
+         coalescer.embed("a")
+   finally:
+      release.set()
+
+def test_async_texts_share_one_request():
+   calls = []
+
+   async def embed(texts):
+      calls.append(list(texts))
+      return vectors_for(texts)
+
+   async def main():
+      coalescer = AsyncCoalescer(embed, window=0.05, max_inputs=100)
+      return await asyncio.gather(*(coalescer.embed(t) for t in ["a", "bb", "a"]))
+
+   assert asyncio.run(main()) == [[1.0], [2.0], [1.0]]
+   assert calls == [["a", "bb"]]
+
+def test_async_count_mismatch_fails_every_waiter():
+   async def embed(texts):
+      return vectors_for(texts)[:1]
+
+   async def main():
+      coalescer = AsyncCoalescer(embed, window=0.01, max_inputs=100)
+      return await asyncio.gather(*(coalescer.embed(t) for t in "abc"), return_exceptions=True)
+
+   results = asyncio.run(main())
+   assert len(results) == 3 and all(isinstance(r, RuntimeError) for r in results)
@@ -0,0 +1,30 @@
+import extractor
+from shared.cache import TextCache
+
+def test_cached_text_is_served_one_file_at_a_time(tmp_path, monkeypatch):
+   paths = []
+
+   for name in "abc":
+      path = tmp_path / f"{name}.txt"
+      path.write_text(name)
+      paths.append(path)
+
+   cache = TextCache(tmp_path / "text.sqlite", 1024 * 1024)
+   cache.store(f"pypdf:{extractor.file_parent_id(paths[0])}", "cached a")
+   cache.store(f"pypdf:{extractor.file_parent_id(paths[2])}", "cached c")
+   lookups, read = [], []
+
+   lookup = cache.lookup
+   monkeypatch.setattr(cache, "lookup", lambda keys: lookups.append(len(keys)) or lookup(keys))
+   monkeypatch.setattr(extractor, "get_text_cache", lambda: cache)
+
+   def read_all(paths, workers, timeout, engine):
+      read.extend(paths)
+      yield from ((p, f"parsed {p.stem}") for p in paths)
+
+   monkeypatch.setattr(extractor, "read_all", read_all)
+
+   assert list(extractor.extract(paths, engine="pypdf")) == [(paths[0], "cached a"), (paths[2], "cached c"), (paths[1], "parsed b")]
+   assert lookups == [1, 1] and read == [paths[1]]
+   # what was parsed is cached for the next run
+   assert cache.lookup([f"pypdf:{extractor.file_parent_id(paths[1])}"]) == {f"pypdf:{extractor.file_parent_id(paths[1])}": "parsed b"}
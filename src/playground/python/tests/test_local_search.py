@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from shared.cache import index_version
+from shared.local_search import LocalIndex, RRF_K, current_version, tokenize, top_k, write_local_index
+
+CHUNKS = [
+   ("inflation", "Inflation fell as long term treasury yields declined."),
+   ("growth", "Nominal growth slowed while the yield curve stayed inverted."),
+   ("bonds", "Long bonds rallied; treasury treasury treasury yields hit new lows."),
+   ("housing", "Housing starts rose with mortgage rates."),
+]
+
+# ranked c0, c1, c2, c3 by similarity to [1, 0, 0]; the lengths differ, which normalizing on export removes
+VECTORS = [[2, 0, 0], [0.8, 0.6, 0], [0.3, 0.4, 0], [0, 0, 1]]
+
+def documents() -> list:
+   return [{"chunk_id": f"c{i}", "parent_id": f"p{i}", "title": title, "chunk": chunk, "meta_data": "{}", "text_vector": VECTORS[i]} for i, (title, chunk) in enumerate(CHUNKS)]
+
+@pytest.fixture
+def index(tmp_path) -> LocalIndex:
+   write_local_index(documents(), tmp_path)
+   return LocalIndex(tmp_path / current_version(tmp_path))
+
+def test_tokenize_lowercases_word_characters():
+   assert tokenize("Long-term U.S. Treasury yields, 2024!") == ["long", "term", "u", "s", "treasury", "yields", "2024"]
+
+def test_top_k_orders_by_score_and_keeps_ties_stable():
+   scores = np.array([0.1, 0.9, 0.5, 0.9, 0.0], dtype=np.float32)
+   assert top_k(scores, 3).tolist() == [1, 3, 2]
+   assert top_k(scores, 10).tolist() == [1, 3, 2, 0, 4]
+   assert top_k(scores, 0).tolist() == []
+
+def test_keyword_ranking_is_bm25(index):
+   # "treasury" three times in a chunk outranks it once; chunks without the term are not matches at all
+   assert index.keyword_ranking("treasury", 10).tolist() == [2, 0]
+   assert index.keyword_ranking("mortgage", 10).tolist() == [3]
+   assert index.keyword_ranking("unknown words", 10).tolist() == []
+
+def test_vector_ranking_is_cosine_similarity(index):
+   assert index.vector_ranking([1, 0, 0], 4).tolist() == [0, 1, 2, 3]
+   # the query's length does not matter either
+   assert index.vector_ranking([0, 5, 0], 2).tolist() == [2, 1]
+
+def test_search_fuses_the_rankings_by_reciprocal_rank(index):
+   # vector ranking c0, c1, c2, c3; keyword ranking c2, c0
+   results = index.search("treasury", [1, 0, 0], k=4, top=4)
+   expected = {"c0": 1 / (RRF_K + 1) + 1 / (RRF_K + 2), "c2": 1 / (RRF_K + 3) + 1 / (RRF_K + 1), "c1": 1 / (RRF_K + 2), "c3": 1 / (RRF_K + 4)}
+
+   assert [doc["chunk_id"] for doc in results] == list(expected)
+   assert [doc["@search.score"] for doc in results] == pytest.approx(list(expected.values()))
+
+def test_search_returns_the_top_fused_results_only(index):
+   assert [doc["chunk_id"] for doc in index.search("treasury", [1, 0, 0], k=4, top=2)] == ["c0", "c2"]
+
+def test_search_results_look_like_the_service(index):
+   result = index.search("housing", [0, 0, 1], k=2, top=1)[0]
+   assert set(result) == {"chunk_id", "parent_id", "title", "chunk", "meta_data", "@search.score", "@search.reranker_score"}
+   assert result["@search.reranker_score"] is None
+
+def test_export_swaps_versions_and_keeps_the_previous_one(tmp_path):
+   before = index_version()
+   write_local_index(documents(), tmp_path)
+   first = current_version(tmp_path)
+   write_local_index(documents(), tmp_path)
+   second = current_version(tmp_path)
+   write_local_index(documents(), tmp_path)
+   third = current_version(tmp_path)
+
+   assert len({first, second, third}) == 3
+   assert sorted(p.name for p in tmp_path.iterdir() if p.is_dir()) == sorted([second, third])
+   assert index_version() != before
+
+def test_a_failed_export_leaves_the_current_version(tmp_path):
+   write_local_index(documents(), tmp_path)
+   current = current_version(tmp_path)
+   docs = documents()
+   docs[2]["text_vector"] = None
+
+   with pytest.raises(RuntimeError, match="no text_vector"):
+      write_local_index(docs, tmp_path)
+
+   assert current_version(tmp_path) == current
+   assert [p.name for p in tmp_path.iterdir() if p.is_dir()] == [current]
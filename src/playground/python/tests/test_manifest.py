@@ -0,0 +1,92 @@
+from pathlib import Path
+from manifest import Manifest
+
+def chunk(parent_id: str, title: str, n: int) -> dict:
+   return {"chunk_id": f"{parent_id}_{n}", "parent_id": parent_id, "title": title}
+
+def indexed(tmp_path: Path, files: dict) -> Manifest:
+   """A saved manifest recording `files` (path -> parent id) with two chunks each, reloaded from disk."""
+   manifest = Manifest(tmp_path / "manifest.json")
+   manifest.plan(files, tmp_path)
+   manifest.record([chunk(parent_id, path.name, n) for path, parent_id in files.items() for n in range(2)], [])
+   manifest.save()
+   return Manifest(tmp_path / "manifest.json")
+
+def test_new_files_are_planned_and_recorded_once_uploaded(tmp_path):
+   a = tmp_path / "docs" / "a.pdf"
+   manifest = Manifest(tmp_path / "manifest.json")
+
+   assert manifest.plan({a: "p1"}, tmp_path / "docs") == ([a], [], ["a.pdf"])
+   # planning alone does not record anything
+   assert manifest.files == {}
+
+   manifest.record([chunk("p1", "a.pdf", 0), chunk("p1", "a.pdf", 1)], [])
+   assert manifest.files[str(a.resolve())] == {"parent_id": "p1", "title": "a.pdf", "chunk_ids": ["p1_0", "p1_1"]}
+
+def test_unchanged_files_are_skipped(tmp_path):
+   a = tmp_path / "docs" / "a.pdf"
+   manifest = indexed(tmp_path, {a: "p1"})
+
+   assert manifest.plan({a: "p1"}, tmp_path / "docs") == ([], [], [])
+
+def test_modified_files_are_replanned_and_dropped_until_uploaded(tmp_path):
+   a = tmp_path / "docs" / "a.pdf"
+   manifest = indexed(tmp_path, {a: "p1"})
+
+   assert manifest.plan({a: "p2"}, tmp_path / "docs") == ([a], ["p1"], [])
+   assert str(a.resolve()) not in manifest.files
+
+   manifest.record([chunk("p2", "a.pdf", 0)], [])
+   assert manifest.files[str(a.resolve())]["parent_id"] == "p2"
+
+def test_deleted_files_are_only_those_under_the_root(tmp_path):
+   a, b = tmp_path / "docs" / "a.pdf", tmp_path / "docs" / "b.pdf"
+   other = tmp_path / "other" / "c.pdf"
+   manifest = indexed(tmp_path, {a: "p1", b: "p2", other: "p3"})
+
+   # b.pdf was deleted; other/c.pdf was indexed from another directory and is not part of this run
+   assert manifest.plan({a: "p1"}, tmp_path / "docs") == ([], ["p2"], [])
+   assert set(manifest.files) == {str(a.resolve()), str(other.resolve())}
+
+def test_a_sibling_directory_with_a_common_prefix_is_not_under_the_root(tmp_path):
+   a, sibling = tmp_path / "docs" / "a.pdf", tmp_path / "docs2" / "b.pdf"
+   manifest = indexed(tmp_path, {a: "p1", sibling: "p2"})
+
+   assert manifest.plan({a: "p1"}, tmp_path / "docs") == ([], [], [])
+   assert str(sibling.resolve()) in manifest.files
+
+def test_a_failed_chunk_leaves_its_file_out(tmp_path):
+   a, b = tmp_path / "docs" / "a.pdf", tmp_path / "docs" / "b.pdf"
+   manifest = Manifest(tmp_path / "manifest.json")
+   manifest.plan({a: "p1", b: "p2"}, tmp_path / "docs")
+
+   manifest.record([chunk("p1", "a.pdf", 0), chunk("p2", "b.pdf", 0)], [])
+   manifest.record([chunk("p2", "b.pdf", 2)], [chunk("p1", "a.pdf", 1)])
+   # a batch of a.pdf that uploads after the failure does not bring it back
+   manifest.record([chunk("p1", "a.pdf", 2)], [])
+
+   assert set(manifest.files) == {str(b.resolve())}
+   assert manifest.files[str(b.resolve())]["chunk_ids"] == ["p2_0", "p2_2"]
+
+def test_a_file_without_text_is_recorded_and_then_skipped(tmp_path):
+   scan = tmp_path / "docs" / "scan.pdf"
+   manifest = Manifest(tmp_path / "manifest.json")
+   manifest.plan({scan: "p1"}, tmp_path / "docs")
+
+   manifest.add_empty(scan)
+   manifest.save()
+
+   assert manifest.files[str(scan.resolve())] == {"parent_id": "p1", "title": "scan.pdf", "chunk_ids": []}
+   assert Manifest(tmp_path / "manifest.json").plan({scan: "p1"}, tmp_path / "docs") == ([], [], [])
+
+def test_only_planned_files_are_recorded_empty(tmp_path):
+   a, b = tmp_path / "docs" / "a.pdf", tmp_path / "docs" / "b.pdf"
+   manifest = Manifest(tmp_path / "manifest.json")
+   manifest.plan({a: "p1", b: "p2"}, tmp_path / "docs")
+   # a chunk of b.pdf failed to upload
+   manifest.record([], [chunk("p2", "b.pdf", 0)])
+
+   manifest.add_empty(tmp_path / "docs" / "unplanned.pdf")
+   manifest.add_empty(b)
+
+   assert manifest.files == {}
@@ -0,0 +1,91 @@
+import json
+import pytest
+from shared.config_loader import load_config
+from shared.search import embedding_options, format_documents, format_results
+
+def doc(title: str, parent_id: str, reranker_score, score: float = 0.03) -> dict:
+   return {"title": title, "parent_id": parent_id, "chunk": f"text of\n{title}", "meta_data": "{\"page\": 1}", "@search.score": score, "@search.reranker_score": reranker_score}
+
+def test_documents_are_grouped_by_parent_and_ranked_by_their_best_chunk():
+   docs = [doc("a.pdf", "p1", 2.0), doc("b.pdf", "p2", 2.5), doc("a.pdf", "p1", 3.0), doc("c.pdf", "p3", 0.5)]
+
+   # c.pdf's only chunk is below the reranker's "somewhat relevant" mark
+   assert json.loads(format_documents(docs)) == [
+      {"title": "a.pdf", "reranker_score": 3.0, "chunks": 2},
+      {"title": "b.pdf", "reranker_score": 2.5, "chunks": 1},
+   ]
+
+def test_documents_with_the_same_title_from_different_files_stay_apart():
+   assert [d["chunks"] for d in json.loads(format_documents([doc("report.pdf", "p1", 2.0), doc("report.pdf", "p2", 2.0)]))] == [1, 1]
+
+def test_local_results_are_ranked_by_their_fused_score():
+   docs = [doc("a.pdf", "p1", None, 0.016), doc("b.pdf", "p2", None, 0.032)]
+   assert [d["title"] for d in json.loads(format_documents(docs))] == ["b.pdf", "a.pdf"]
+
+def test_results_keep_stdout_clean_for_the_mcp_server(capsys):
+   results = json.loads(format_results([doc("a.pdf", "p1", 2.0), doc("b.pdf", "p2", 0.5)]))
+
+   assert results == [{"title": "a.pdf", "reranker_score": 2.0, "content": "text of a.pdf", "metadata": "{\"page\": 1}"}]
+   assert capsys.readouterr().out == ""
+
+@pytest.mark.parametrize("model, dimensions, sent", [
+   ("text-embedding-ada-002", 1536, None),
+   ("text-embedding-3-large", 1536, 1536),
+   ("text-embedding-3-small", 512, 512),
+   # ada-002 cannot shorten, so the request fails rather than silently returning 1536 floats
+   ("text-embedding-ada-002", 512, 512),
+])
+def test_dimensions_are_sent_to_every_model_but_ada_002(monkeypatch, model, dimensions, sent):
+   monkeypatch.setitem(load_config(), "AZURE_OPENAI_EMBEDDINGS_MODEL", model)
+   monkeypatch.setitem(load_config(), "AZURE_OPENAI_EMBEDDINGS_DIMENSIONS", dimensions)
+
+   assert embedding_options().get("dimensions") == sent
+
+def test_arun_keeps_cache_io_off_the_event_loop(monkeypatch):
+   import asyncio, threading
+   import shared.search as search
+
+   loop_threads, calls = set(), []
+
+   class Cache:
+      """Records the thread of every call that would touch SQLite or the index version file."""
+
+      def record(self, name):
+         calls.append((name, threading.get_ident()))
+
+      def key(self, query, **params):
+         self.record("key")
+         return query
+
+      def get(self, key):
+         self.record("get")
+
+      def put(self, key, value):
+         self.record("put")
+
+      def lookup(self, texts):
+         self.record("lookup")
+         return {}
+
+      def store(self, texts, vectors):
+         self.record("store")
+
+   cache = Cache()
+   monkeypatch.setattr(search, "get_query_cache", lambda: cache)
+   monkeypatch.setattr(search, "get_embedding_cache", lambda: cache)
+   monkeypatch.setattr(search, "get_async_coalescer", lambda: None)
+   monkeypatch.setattr(search, "search_backend", lambda: "local")
+   monkeypatch.setattr(search, "local_search", lambda query, vector, titles_only: [doc("a.pdf", "p1", 2.0)])
+
+   async def aembed_texts(texts):
+      return [[1.0] for _ in texts]
+
+   monkeypatch.setattr(search, "aembed_texts", aembed_texts)
+
+   async def main():
+      loop_threads.add(threading.get_ident())
+      return await search.arun("inflation")
+
+   assert json.loads(asyncio.run(main()))[0]["title"] == "a.pdf"
+   assert sorted(name for name, _ in calls) == ["get", "key", "lookup", "put", "store"]
+   assert not loop_threads & {thread for _, thread in calls}
@@ -0,0 +1,31 @@
+import pytest
+from splitter import SEPARATORS, iter_split, split
+
+text_splitters = pytest.importorskip("langchain_text_splitters")
+
+PARAGRAPH = ("Monetary policy works with long and variable lags. Inflation expectations anchor long rates; "
+   "the term premium does the rest. Does the yield curve still predict recessions? Often, but not always! "
+   "Treasury yields, in the end, follow nominal growth: ")
+
+TEXTS = [
+   "",
+   "short text",
+   PARAGRAPH * 20,
+   "\n\n".join(PARAGRAPH * n for n in range(1, 8)),
+   "\n".join(f"line {i}: " + "x" * (i * 37 % 300) for i in range(200)),
+   "a" * 5000,
+   " ".join("word" for _ in range(3000)),
+]
+
+def reference(max_size: int, overlap: int, length=len):
+   return text_splitters.RecursiveCharacterTextSplitter(chunk_size=max_size, chunk_overlap=overlap, separators=SEPARATORS, length_function=length)
+
+@pytest.mark.parametrize("max_size, overlap", [(1200, 200), (300, 50), (100, 0), (50, 49)])
+@pytest.mark.parametrize("text", TEXTS, ids=range(len(TEXTS)))
+def test_split_matches_langchain(text, max_size, overlap):
+   assert split(text, max_size, overlap) == reference(max_size, overlap).split_text(text)
+
+@pytest.mark.parametrize("text", TEXTS, ids=range(len(TEXTS)))
+def test_iter_split_matches_langchain_with_a_custom_length(text):
+   words = lambda s: len(s.split())
+   assert list(iter_split(text, 60, 10, words)) == reference(60, 10, words).split_text(text)
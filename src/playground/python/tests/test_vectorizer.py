@@ -0,0 +1,76 @@
+import pytest
+import vectorizer
+from vectorizer import TokenBucket, plan_batches
+
+class Clock:
+   """Stands in for the `time` module: sleeping advances the clock instead of waiting."""
+
+   def __init__(self):
+      self.now, self.slept = 0.0, []
+
+   def monotonic(self) -> float:
+      return self.now
+
+   def sleep(self, seconds: float):
+      self.slept.append(seconds)
+      self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+   clock = Clock()
+   monkeypatch.setattr(vectorizer, "time", clock)
+   return clock
+
+def test_bucket_starts_full_and_then_waits_for_the_refill(clock):
+   bucket = TokenBucket(per_minute=600)
+   bucket.acquire(600)
+   assert clock.slept == []
+
+   # 10 units a second
+   bucket.acquire(50)
+   assert clock.now == pytest.approx(5)
+
+def test_bucket_refills_while_idle_up_to_its_capacity(clock):
+   bucket = TokenBucket(per_minute=60)
+   bucket.acquire(60)
+   clock.now += 3600
+
+   bucket.acquire(60)
+   bucket.acquire(1)
+   assert clock.now == pytest.approx(3601)
+
+def test_request_larger_than_the_bucket_waits_for_a_full_bucket_only(clock):
+   bucket = TokenBucket(per_minute=60)
+   bucket.acquire(1000)
+   assert clock.slept == []
+
+@pytest.mark.parametrize("per_minute", [0, -1])
+def test_zero_means_no_limit(clock, per_minute):
+   bucket = TokenBucket(per_minute)
+
+   for _ in range(100):
+      bucket.acquire(1_000_000)
+
+   assert clock.slept == []
+
+def test_batches_are_packed_by_tokens_in_order():
+   counts = {"a": 10, "b": 15, "c": 5, "d": 20}
+   assert plan_batches(list(counts), max_inputs=100, max_tokens=30, token_counts=counts) == [(["a", "b", "c"], 30), (["d"], 20)]
+
+def test_batches_are_capped_by_inputs():
+   counts = {c: 1 for c in "abcde"}
+   assert plan_batches(list(counts), max_inputs=2, max_tokens=100, token_counts=counts) == [(["a", "b"], 2), (["c", "d"], 2), (["e"], 1)]
+
+def test_a_chunk_over_the_token_limit_gets_a_batch_of_its_own():
+   counts = {"a": 5, "big": 50, "b": 5}
+   assert plan_batches(list(counts), max_inputs=100, max_tokens=20, token_counts=counts) == [(["a"], 5), (["big"], 50), (["b"], 5)]
+
+def test_chunks_without_a_count_are_tokenized(monkeypatch):
+   counted = []
+   monkeypatch.setattr(vectorizer, "counter", lambda text: counted.append(text) or len(text))
+
+   assert plan_batches(["aaaa", "bb", "cccccc"], max_inputs=100, max_tokens=8, token_counts={"aaaa": 1}) == [(["aaaa", "bb"], 3), (["cccccc"], 6)]
+   assert counted == ["bb", "cccccc"]
+
+def test_no_chunks_no_batches():
+   assert plan_batches([]) == []
@@ -1,37 +1,35 @@
 import sys
 from azure.search.documents.indexes.models import SearchIndexerDataSourceConnection, SearchIndexerDataContainer, SearchIndexerDataSourceType
+from azure.search.documents.indexes.models import HighWaterMarkChangeDetectionPolicy, SoftDeleteColumnDeletionDetectionPolicy
 from azure.core.exceptions import ResourceNotFoundError, HttpResponseError
-from shared import get_search_indexer_client, set_search_config, print_header, STANDARD_KEYS
+from shared import get_search_indexer_client, set_search_config, print_header, put_definition, GA_API_VERSION, STANDARD_KEYS
 
 keys = STANDARD_KEYS + [
    "DATASOURCE_NAME",
    "CONTAINER_NAME",
    "STORAGE_ACCOUNT_ID",
+   # blank uses the blob indexer's built-in LastModified tracking; "high_water_mark" tracks HIGH_WATER_MARK_COLUMN instead
+   "DATA_CHANGE_DETECTION",
+   "HIGH_WATER_MARK_COLUMN",
+   # blank removes nothing; "native_blob_soft_delete" needs blob soft delete on the account; "soft_delete_column" uses the metadata below
+   "DATA_DELETION_DETECTION",
+   "SOFT_DELETE_COLUMN",
+   "SOFT_DELETE_MARKER",
 ]
  
 print_header("Datasource")
 config = set_search_config(keys)
 
 def create_datasource(): 
-   datasource_name, container_name, storage_account_id = (
-      config[k] for k in ("DATASOURCE_NAME", "CONTAINER_NAME", "STORAGE_ACCOUNT_ID")
-   )
+   datasource_name = config["DATASOURCE_NAME"]
 
    try:        
       if config.get('OPERATION', 'create') == 'delete':
          delete_datasource(datasource_name)
          return
       
-      indexer_client = get_search_indexer_client(config)
-      
-      datasource = SearchIndexerDataSourceConnection(name=datasource_name,
-         type=SearchIndexerDataSourceType.AZURE_BLOB,
-         connection_string=f"ResourceId={storage_account_id};",
-         container=SearchIndexerDataContainer(name=container_name)
-      )
-      
       try:
-         result = indexer_client.create_or_update_data_source_connection(datasource)
+         result = save_datasource(create_datasource_definition())
          print(f"SUCCESS: Datasource '{datasource_name}' created/updated successfully")
          print(f"Datasource details: {result.name} -> {result.container.name}")
          
@@ -44,6 +42,53 @@ def create_datasource():
       print(f"ERROR: {str(e)}")
       sys.exit(1)
 
+def create_datasource_definition() -> SearchIndexerDataSourceConnection:
+   datasource_name, container_name, storage_account_id = (
+      config[k] for k in ("DATASOURCE_NAME", "CONTAINER_NAME", "STORAGE_ACCOUNT_ID")
+   )
+
+   change_detection, deletion_detection = (config.get(k) or "" for k in ("DATA_CHANGE_DETECTION", "DATA_DELETION_DETECTION"))
+   change_policy, deletion_policy = None, None
+
+   if change_detection == "high_water_mark":
+      change_policy = HighWaterMarkChangeDetectionPolicy(high_water_mark_column_name=config.get("HIGH_WATER_MARK_COLUMN") or "metadata_storage_last_modified")
+   elif change_detection:
+      raise Exception(f"Unknown DATA_CHANGE_DETECTION '{change_detection}'")
+
+   if deletion_detection == "soft_delete_column":
+      deletion_policy = SoftDeleteColumnDeletionDetectionPolicy(
+         soft_delete_column_name=config.get("SOFT_DELETE_COLUMN") or "IsDeleted",
+         soft_delete_marker_value=config.get("SOFT_DELETE_MARKER") or "true")
+   elif deletion_detection not in ("", "native_blob_soft_delete"):
+      raise Exception(f"Unknown DATA_DELETION_DETECTION '{deletion_detection}'")
+
+   return SearchIndexerDataSourceConnection(name=datasource_name,
+      type=SearchIndexerDataSourceType.AZURE_BLOB,
+      connection_string=f"ResourceId={storage_account_id};",
+      container=SearchIndexerDataContainer(name=container_name),
+      data_change_detection_policy=change_policy,
+      data_deletion_detection_policy=deletion_policy
+   )
+
+REST_COLLECTION, REST_API_VERSION = "datasources", GA_API_VERSION
+
+def rest_extra() -> dict:
+   """Settings the SDK models have no property for, sent through REST: the native soft-delete policy."""
+   if config.get("DATA_DELETION_DETECTION") != "native_blob_soft_delete":
+      return {}
+
+   return {"dataDeletionDetectionPolicy": {"@odata.type": "#Microsoft.Azure.Search.NativeBlobSoftDeleteDeletionDetectionPolicy"}}
+
+def save_datasource(datasource: SearchIndexerDataSourceConnection) -> SearchIndexerDataSourceConnection:
+   indexer_client = get_search_indexer_client(config)
+   extra = rest_extra()
+
+   if not extra:
+      return indexer_client.create_or_update_data_source_connection(datasource)
+
+   put_definition(config, REST_COLLECTION, datasource, extra, REST_API_VERSION)
+   return indexer_client.get_data_source_connection(datasource.name)
+
 def delete_datasource(datasource_name):
     try:           
         try:
@@ -2,6 +2,7 @@ import sys
 from azure.search.documents.indexes.models import SearchIndex, SearchField, SearchFieldDataType, SearchableField, SimpleField, LexicalAnalyzerName
 from azure.search.documents.indexes.models import SemanticConfiguration, SemanticPrioritizedFields, SemanticField, SemanticSearch
 from azure.search.documents.indexes.models import VectorSearch, HnswAlgorithmConfiguration, HnswParameters, VectorSearchProfile, AzureOpenAIVectorizer, AzureOpenAIVectorizerParameters
+from azure.search.documents.indexes.models import ScalarQuantizationCompression, ScalarQuantizationParameters, BinaryQuantizationCompression
 from azure.core.exceptions import ResourceNotFoundError, HttpResponseError
 from shared import get_search_index_client, set_search_config, print_header, STANDARD_KEYS
 
@@ -9,7 +10,18 @@ keys = STANDARD_KEYS + [
    "INDEX_NAME",
    "AZURE_OPENAI_ENDPOINT",
    "EMBEDDING_DEPLOYMENT_ID",
-   "EMBEDDING_MODEL_NAME"
+   "EMBEDDING_MODEL_NAME",
+   # must match the skillset's EMBEDDING_DIMENSIONS and the playground's AZURE_OPENAI_EMBEDDINGS_DIMENSIONS (default 1536)
+   "EMBEDDING_DIMENSIONS",
+   # "single" (float32, default) or "half" (float16, half the storage)
+   "VECTOR_TYPE",
+   # blank (none), "scalar" (int8) or "binary" (1 bit per dimension)
+   "VECTOR_COMPRESSION",
+   # rescoring compressed results with the full-precision vectors ("true" by default) and how many extra candidates to rescore
+   "VECTOR_RESCORE",
+   "VECTOR_OVERSAMPLING",
+   # "false" drops the retrievable copy of each vector; queries never return it
+   "VECTOR_STORED"
 ]
 
 print_header("Search Index")
@@ -39,6 +51,18 @@ def create_search_index_definition():
    vectorizer_name = f"{index_name}-azureOpenAi-text-vectorizer"
    profile_name = f"{index_name}-azureOpenAi-text-profile"
    semantic_config_name = f"default"
+   compression_name = f"{index_name}-compression"
+
+   dimensions = int(config.get('EMBEDDING_DIMENSIONS') or 1536)
+   vector_type = config.get('VECTOR_TYPE') or "single"
+   compression = config.get('VECTOR_COMPRESSION') or ""
+   stored = (config.get('VECTOR_STORED') or "true").lower() == "true"
+
+   if vector_type not in ("single", "half"):
+      raise Exception(f"Unknown VECTOR_TYPE '{vector_type}'")
+
+   if compression not in ("", "scalar", "binary"):
+      raise Exception(f"Unknown VECTOR_COMPRESSION '{compression}'")
      
    def create_fields():
       chunk_id_field = SearchField(
@@ -96,14 +120,16 @@ def create_search_index_definition():
 
       text_vector = SearchField(
          name="text_vector",
-         type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
+         type=SearchFieldDataType.Collection("Edm.Half" if vector_type == "half" else SearchFieldDataType.Single),
          searchable=True,
          retrievable=True,
+         hidden=not stored,
+         stored=stored,
          filterable=False,
          sortable=False, 
          facetable=False,
          key=False,
-         vector_search_dimensions=1536,
+         vector_search_dimensions=dimensions,
          vector_search_profile_name=profile_name
       )
 
@@ -131,16 +157,32 @@ def create_search_index_definition():
          parameters=vectorizer_params
       )
       
+      compressions = []
+
+      if compression:
+         rescore = (config.get('VECTOR_RESCORE') or "true").lower() == "true"
+         # oversampling can only be set when rescoring
+         oversampling = float(config['VECTOR_OVERSAMPLING']) if rescore and config.get('VECTOR_OVERSAMPLING') else None
+
+         if compression == "scalar":
+            compressions.append(ScalarQuantizationCompression(compression_name=compression_name, rerank_with_original_vectors=rescore,
+               default_oversampling=oversampling, parameters=ScalarQuantizationParameters(quantized_data_type="int8")))
+         else:
+            compressions.append(BinaryQuantizationCompression(compression_name=compression_name, rerank_with_original_vectors=rescore,
+               default_oversampling=oversampling))
+
       profile_config = VectorSearchProfile(
          name=profile_name, 
          algorithm_configuration_name=algorithm_name,
-         vectorizer_name=vectorizer_name
+         vectorizer_name=vectorizer_name,
+         compression_name=compression_name if compression else None
       )
       
       vector_search = VectorSearch(
          algorithms=[algorithm_config], 
          profiles=[profile_config], 
-         vectorizers=[vectorizer_config]
+         vectorizers=[vectorizer_config],
+         compressions=compressions or None
       )
         
    except Exception as e:
@@ -1,13 +1,23 @@
-import sys
-from azure.search.documents.indexes.models import SearchIndexer, IndexingParameters, FieldMapping, IndexingParametersConfiguration
+import argparse, json, sys, time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from azure.search.documents.indexes.models import SearchIndexer, IndexingParameters, FieldMapping, IndexingParametersConfiguration, IndexingSchedule
 from azure.core.exceptions import ResourceNotFoundError, HttpResponseError
-from shared import get_search_indexer_client, set_search_config, print_header, STANDARD_KEYS
+from shared import get_search_indexer_client, set_search_config, print_header, put_definition, PREVIEW_API_VERSION, STANDARD_KEYS
 
 keys = STANDARD_KEYS + [
    "DATASOURCE_NAME",
    "INDEXER_NAME",
    "SKILLSET_NAME",
-   "INDEX_NAME"
+   "INDEX_NAME",
+   # connection string (or "ResourceId=<storage account id>;") for the incremental enrichment cache; blank disables it
+   "ENRICHMENT_CACHE_STORAGE",
+   "ENRICHMENT_CACHE_REPROCESSING",
+   "INDEXER_BATCH_SIZE",
+   "INDEXER_MAX_FAILED_ITEMS",
+   "INDEXER_MAX_FAILED_ITEMS_PER_BATCH",
+   # minutes between scheduled runs (at least 5); blank runs on demand only
+   "INDEXER_SCHEDULE_MINUTES"
 ]
 
 print_header("Search Indexer") 
@@ -20,7 +30,7 @@ def create_indexer():
          return
     
       try:
-         result = get_search_indexer_client(config).create_or_update_indexer(create_indexer_definition())
+         result = save_indexer(create_indexer_definition())
          print(f"SUCCESS: Indexer '{result.target_index_name}' created/updated successfully")
          print(f"Indexer details: {result.name} -> DataSource: {result.data_source_name}, Index: {result.target_index_name}")
          
@@ -47,12 +57,15 @@ def create_indexer_definition():
    )
 
    parameters = IndexingParameters(
-      batch_size=None,
-      max_failed_items=None,
-      max_failed_items_per_batch=None,
+      batch_size=int_setting('INDEXER_BATCH_SIZE'),
+      max_failed_items=int_setting('INDEXER_MAX_FAILED_ITEMS'),
+      max_failed_items_per_batch=int_setting('INDEXER_MAX_FAILED_ITEMS_PER_BATCH'),
       configuration=configuration
    )
 
+   schedule_minutes = int_setting('INDEXER_SCHEDULE_MINUTES')
+   schedule = IndexingSchedule(interval=timedelta(minutes=schedule_minutes)) if schedule_minutes else None
+
    field_mappings = [
       FieldMapping(
          source_field_name="metadata_storage_name",
@@ -69,12 +82,42 @@ def create_indexer_definition():
       parameters=parameters,
       field_mappings=field_mappings,
       output_field_mappings=[], 
-      schedule=None,  
+      schedule=schedule,  
       description=None,
       encryption_key=None,
       cache=None
    )
    
+def int_setting(key: str) -> Optional[int]:
+   value = config.get(key) or ""
+   return int(value) if value else None
+
+REST_COLLECTION, REST_API_VERSION = "indexers", PREVIEW_API_VERSION
+
+def rest_extra() -> dict:
+   """Settings the SDK models have no property for, sent through the preview REST API: the enrichment cache."""
+   storage = config.get('ENRICHMENT_CACHE_STORAGE') or ""
+
+   if not storage:
+      return {}
+
+   return {"cache": {"storageConnectionString": storage, "enableReprocessing": (config.get('ENRICHMENT_CACHE_REPROCESSING') or "true").lower() == "true"}}
+
+def save_indexer(indexer: SearchIndexer) -> SearchIndexer:
+   """
+   Creates or updates the indexer.  With ENRICHMENT_CACHE_STORAGE set, the enrichment cache is attached through
+   the preview REST API (the SDK has no cache property), so unchanged documents skip cracking, splitting and
+   embedding on later runs and only skills affected by a skillset change are re-run.
+   """
+   indexer_client = get_search_indexer_client(config)
+   extra = rest_extra()
+
+   if not extra:
+      return indexer_client.create_or_update_indexer(indexer)
+
+   put_definition(config, REST_COLLECTION, indexer, extra, REST_API_VERSION)
+   return indexer_client.get_indexer(indexer.name)
+
 def delete_indexer():
    try:        
       try:
@@ -90,18 +133,22 @@ def delete_indexer():
       print(f"WARNING: Error deleting indexer: {str(e)}")
       raise e
 
-def run_indexer():
+def run_indexer() -> bool:
+   """Starts a run; False when the service refused it (e.g. 409 while a run is already in progress)."""
    try:        
       try:
          indexer_name = config.get('INDEXER_NAME', '')
          get_search_indexer_client(config).run_indexer(indexer_name)
          print(f"SUCCESS: Indexer '{indexer_name}' started successfully")
+         return True
       except HttpResponseError as e:
          print(f"WARNING: Failed to run indexer: {e.message}")
          
    except Exception as e:
       print(f"WARNING: Error running indexer: {str(e)}")
 
+   return False
+
 def get_indexer_status():
    try:
       indexer_name = config.get('INDEXER_NAME', '')
@@ -118,6 +165,85 @@ def get_indexer_status():
    except Exception as e:
       print(f"Error getting indexer status: {str(e)}")
 
+def last_run_start() -> datetime:
+   status = get_search_indexer_client(config).get_indexer_status(config.get('INDEXER_NAME', ''))
+   return status.last_result.start_time if status.last_result else datetime.min.replace(tzinfo=timezone.utc)
+
+def monitor_indexer(after: Optional[datetime] = None, timeout: float = 3600, total: Optional[int] = None, record_path: Optional[str] = None, min_interval: float = 2, max_interval: float = 30) -> int:
+   """
+   Follows the indexer's run until it completes: the run in progress, or with `after` the first run started
+   after that time.  Prints items/sec, failed items and an ETA (when `total` items are expected) whenever
+   they change, polling every `min_interval` seconds and backing off to `max_interval` while nothing moves.
+   Returns 0 when the run succeeds, 1 when it fails or (without `after`) no run is in progress, and 2 on
+   timeout; with `record_path` a JSON line timing the run is appended to that file.
+   """
+   indexer_name = config.get('INDEXER_NAME', '')
+   client = get_search_indexer_client(config)
+   deadline = time.monotonic() + timeout
+   interval, polls, seen = min_interval, 0, None
+
+   while True:
+      status = client.get_indexer_status(indexer_name)
+      result = status.last_result
+      polls += 1
+
+      if after is None and polls == 1 and not (result is not None and result.status == "inProgress"):
+         # a finished run is not reported as if it had just been followed
+         print(f"INFO: Indexer '{indexer_name}' has no run in progress (status: {status.status})")
+         return 1
+
+      current = result is not None and (after is None or result.start_time > after)
+
+      if status.status == "error" or (current and result.status != "inProgress") or (not current and after is None):
+         break
+
+      if time.monotonic() >= deadline:
+         print(f"WARNING: Indexer '{indexer_name}' still running after {timeout:.0f}s")
+         return 2
+
+      if current and (result.item_count, result.failed_item_count) != seen:
+         seen = (result.item_count, result.failed_item_count)
+         elapsed = (datetime.now(timezone.utc) - result.start_time).total_seconds()
+         rate = result.item_count / elapsed if elapsed > 0 else 0.0
+         eta = f", ETA {(total - result.item_count) / rate:.0f}s" if total and rate else ""
+         print(f"  {indexer_name}: {result.item_count} items ({result.failed_item_count} failed) in {elapsed:.0f}s, {rate:.2f} items/sec{eta}")
+         interval = min_interval
+      else:
+         interval = min(max_interval, interval * 1.5)
+
+      time.sleep(interval)
+
+   if not current:
+      print(f"ERROR: Indexer '{indexer_name}' has no run to follow (status: {status.status})")
+      return 1
+
+   end_time = result.end_time or datetime.now(timezone.utc)
+   seconds = (end_time - result.start_time).total_seconds()
+
+   record = {
+      "indexer": indexer_name,
+      "status": result.status,
+      "start_time": result.start_time.isoformat(),
+      "end_time": end_time.isoformat(),
+      "seconds": round(seconds, 1),
+      "items": result.item_count,
+      "failed_items": result.failed_item_count,
+      "items_per_sec": round(result.item_count / seconds, 2) if seconds > 0 else 0.0,
+      "polls": polls,
+      "error": result.error_message,
+   }
+
+   print(f"Indexer '{indexer_name}' run {result.status}: {record['items']} items ({record['failed_items']} failed) in {record['seconds']}s, {record['items_per_sec']} items/sec")
+
+   if result.error_message:
+      print(f"  Error: {result.error_message}")
+
+   if record_path:
+      with open(record_path, "a", encoding="utf-8") as f:
+         f.write(json.dumps(record) + "\n")
+
+   return 0 if result.status == "success" else 1
+
 def list_indexers():
    try:        
       indexers = get_search_indexer_client(config).get_indexers()
@@ -129,6 +255,28 @@ def list_indexers():
       print(f"Error listing indexers: {str(e)}")
 
 
+def get_args():
+   parser = argparse.ArgumentParser(description="Create or update the search indexer; --run and --monitor act on the existing indexer instead.")
+   parser.add_argument("--run", action="store_true", help="Start an indexer run")
+   parser.add_argument("--monitor", action="store_true", help="Wait for the run to finish, reporting throughput, and exit with its status")
+   parser.add_argument("--timeout", type=float, default=3600, help="Seconds to wait before giving up (exit code 2)")
+   parser.add_argument("--total", type=int, help="Items expected in the run, for the ETA")
+   parser.add_argument("--record", help="Append a JSON timing record of the run to this file")
+   return parser.parse_args()
+
 if __name__ == "__main__":
-    create_indexer()
-    list_indexers()
\ No newline at end of file
+    args = get_args()
+
+    if not (args.run or args.monitor):
+        create_indexer()
+        list_indexers()
+        sys.exit(0)
+
+    after = last_run_start() if args.run else None
+
+    # a run that failed to start would otherwise be waited for until the timeout
+    if args.run and not run_indexer():
+        sys.exit(1)
+
+    if args.monitor:
+        sys.exit(monitor_indexer(after, args.timeout, args.total, args.record))
\ No newline at end of file
@@ -11,7 +11,9 @@ keys = STANDARD_KEYS + [
    "AZURE_OPENAI_ENDPOINT",
    "AZURE_OPENAI_API_KEY",
    "EMBEDDING_DEPLOYMENT_ID",
-   "EMBEDDING_MODEL_NAME"
+   "EMBEDDING_MODEL_NAME",
+   # must match the index's EMBEDDING_DIMENSIONS; below the model's native size only for text-embedding-3 models
+   "EMBEDDING_DIMENSIONS"
 ]   
 
 print_header("Search Skillset")
@@ -67,7 +69,7 @@ def create_skillset_definition() -> SearchIndexerSkillset:
          resource_url=endpoint,  
          deployment_name=config.get("EMBEDDING_DEPLOYMENT_ID"),  
          model_name=config.get("EMBEDDING_MODEL_NAME"),
-         dimensions=1536
+         dimensions=int(config.get("EMBEDDING_DIMENSIONS") or 1536)
       )
       
       return skill
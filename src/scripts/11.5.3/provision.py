@@ -0,0 +1,186 @@
+import argparse, os, sys, time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Any, Callable
+from tabulate import tabulate
+from azure.core.exceptions import ResourceNotFoundError
+
+# each script reads its settings when imported, so the environment is read and the SDKs loaded once for all four
+import create_search_datasource as datasource
+import create_search_index as index
+import create_search_skillset as skillset
+import create_search_indexer as indexer
+from shared import get_search_indexer_client, get_search_index_client, get_definition, rest_body, print_header
+
+# write-only secrets: the service never returns them, so a changed one cannot be detected by comparing
+SECRETS = {"credentials", "apiKey", "storageConnectionString"}
+# write-only or server-generated properties that never round-trip, so they cannot be compared
+UNCOMPARED = {"@odata.etag", "@odata.context"} | SECRETS
+
+class Step:
+   """
+   One resource to provision.  `rest` is the script whose `rest_extra()` adds settings the SDK models drop;
+   when it returns any, the definition is compared as REST JSON so those settings are compared too.
+   """
+
+   def __init__(self, name: str, depends_on: list[str], definition: Callable, get: Callable, create: Callable, delete: Callable, rest: Any = None):
+      self.name = name
+      self.depends_on = depends_on
+      self.definition = definition
+      self.get = get
+      self.create = create
+      self.delete = delete
+      self.rest = rest
+
+def get_steps() -> dict[str, Step]:
+   indexer_client = lambda: get_search_indexer_client(datasource.config)
+   index_client = lambda: get_search_index_client(index.config)
+
+   steps = [
+      Step("datasource", [], datasource.create_datasource_definition,
+         lambda name: indexer_client().get_data_source_connection(name), datasource.save_datasource,
+         lambda: datasource.delete_datasource(datasource.config["DATASOURCE_NAME"]), rest=datasource),
+      Step("index", [], index.create_search_index_definition,
+         lambda name: index_client().get_index(name), lambda d: index_client().create_or_update_index(d), index.delete_index),
+      Step("skillset", [], skillset.create_skillset_definition,
+         lambda name: indexer_client().get_skillset(name), lambda d: indexer_client().create_or_update_skillset(d), skillset.delete_skillset),
+      Step("indexer", ["datasource", "index", "skillset"], indexer.create_indexer_definition,
+         lambda name: indexer_client().get_indexer(name), indexer.save_indexer, indexer.delete_indexer, rest=indexer),
+   ]
+
+   return {step.name: step for step in steps}
+
+def matches(desired: Any, existing: Any) -> bool:
+   """True when every property set in `desired` has the same value in `existing`; defaults the service fills in are ignored."""
+   if isinstance(desired, dict):
+      return isinstance(existing, dict) and all(matches(v, existing.get(k)) for k, v in desired.items() if v is not None and k not in UNCOMPARED)
+
+   if isinstance(desired, list):
+      return isinstance(existing, list) and len(desired) == len(existing) and all(matches(d, e) for d, e in zip(desired, existing))
+
+   return desired == existing
+
+def secrets(desired: Any, path: str = "") -> list[str]:
+   """The properties of `desired` (as dotted paths) that carry a secret the comparison cannot see."""
+   if isinstance(desired, dict):
+      found = []
+
+      for k, v in desired.items():
+         if k in SECRETS and (any(x is not None for x in v.values()) if isinstance(v, dict) else v):
+            found.append(f"{path}{k}")
+         elif k not in SECRETS:
+            found += secrets(v, f"{path}{k}.")
+
+      return found
+
+   if isinstance(desired, list):
+      return [name for i, item in enumerate(desired) for name in secrets(item, f"{path}{i}.")]
+
+   return []
+
+def serialized(step: Step, definition) -> tuple[dict, dict | None]:
+   """The desired and existing definitions as JSON, or None for the existing one when there is none."""
+   extra = step.rest.rest_extra() if step.rest else {}
+
+   try:
+      if extra:
+         rest = step.rest
+         return rest_body(definition, extra), get_definition(rest.config, rest.REST_COLLECTION, definition.name, rest.REST_API_VERSION)
+
+      return definition.serialize(), step.get(definition.name).serialize()
+   except ResourceNotFoundError:
+      return {}, None
+
+def create(step: Step, force: bool) -> tuple[str, str]:
+   """
+   Sends the definition unless the service already has it.  A definition carrying secrets is always sent,
+   since a rotated key or changed connection string would otherwise go unnoticed.
+   """
+   definition = step.definition()
+   detail = ""
+
+   if not force:
+      desired, existing = serialized(step, definition)
+      sent_secrets = secrets(desired)
+
+      if existing is not None and matches(desired, existing):
+         if not sent_secrets:
+            return "unchanged", ""
+
+         detail = f"sent for its write-only {', '.join(sent_secrets)}"
+
+      action = "updated" if existing is not None else "created"
+   else:
+      action = "created/updated"
+
+   step.create(definition)
+   return action, detail
+
+def delete(step: Step, force: bool) -> tuple[str, str]:
+   step.delete()
+   return "deleted", ""
+
+def run(steps: dict[str, Step], operation: str, workers: int, force: bool) -> list[dict]:
+   """
+   Runs every step as soon as the steps it depends on have finished, up to `workers` at a time.  Deletes
+   run the graph in reverse, so the indexer goes before the resources it reads from.  A failed step skips
+   everything that depends on it.
+   """
+   if operation == "delete":
+      after = {name: [other.name for other in steps.values() if name in other.depends_on] for name in steps}
+   else:
+      after = {name: step.depends_on for name, step in steps.items()}
+
+   action = delete if operation == "delete" else create
+   results: dict[str, dict] = {}
+   running: dict[Future, tuple[str, float]] = {}
+
+   with ThreadPoolExecutor(max_workers=workers) as pool:
+      while len(results) < len(steps):
+         for name in steps:
+            if name in results or name in (n for n, _ in running.values()):
+               continue
+
+            failed = [d for d in after[name] if d in results and results[d]["result"] in ("failed", "skipped")]
+
+            if failed:
+               results[name] = {"step": name, "result": "skipped", "seconds": 0.0, "detail": f"{', '.join(failed)} did not complete"}
+            elif all(d in results for d in after[name]):
+               running[pool.submit(action, steps[name], force)] = (name, time.perf_counter())
+
+         if not running:
+            break
+
+         done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+
+         for future in done:
+            name, started = running.pop(future)
+            seconds = round(time.perf_counter() - started, 2)
+
+            try:
+               result, detail = future.result()
+               results[name] = {"step": name, "result": result, "seconds": seconds, "detail": detail}
+            except BaseException as e:
+               # the scripts report their own errors and call sys.exit(1)
+               detail = f"exit code {e.code}" if isinstance(e, SystemExit) else str(e)
+               results[name] = {"step": name, "result": "failed", "seconds": seconds, "detail": detail}
+
+   return [results[name] for name in steps]
+
+def get_args():
+   parser = argparse.ArgumentParser(description="Create or delete the datasource, index, skillset and indexer in one process.")
+   parser.add_argument("--operation", choices=["create", "delete"], default=os.getenv("OPERATION", "create") or "create")
+   parser.add_argument("--workers", type=int, default=3, help="Steps run concurrently")
+   parser.add_argument("--force", action="store_true", help="Send every definition even if the service already has it")
+   return parser.parse_args()
+
+if __name__ == "__main__":
+   args = get_args()
+   print_header(f"Provisioning ({args.operation})")
+
+   start = time.perf_counter()
+   rows = run(get_steps(), args.operation, args.workers, args.force)
+
+   print(tabulate(rows, headers="keys", tablefmt="github"))
+   print(f"\nfinished in {time.perf_counter() - start:.2f}s")
+
+   sys.exit(1 if any(r["result"] in ("failed", "skipped") for r in rows) else 0)
@@ -1,9 +1,23 @@
-import os
+import json, os, threading, time
+from pathlib import Path
 from tabulate import tabulate
 from azure.identity import DefaultAzureCredential
 from azure.mgmt.search import SearchManagementClient
 from azure.search.documents.indexes import SearchIndexerClient, SearchIndexClient
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+
+# admin keys are also written here (owner-only) so later runs skip the management-plane lookup; empty disables
+KEY_CACHE_PATH = os.getenv("SEARCH_KEY_CACHE_PATH", "").strip()
+KEY_CACHE_TTL = float(os.getenv("SEARCH_KEY_CACHE_TTL", "3600"))
+
+# the indexer enrichment cache is only in the preview REST API, which the pinned SDK does not speak
+PREVIEW_API_VERSION = "2024-05-01-preview"
+GA_API_VERSION = "2024-07-01"
+
+# one credential, admin key and client per search service for the whole process
+cache: dict = {}
+cache_lock = threading.RLock()
 
 STANDARD_KEYS = [
    "OPERATION",
@@ -35,13 +49,97 @@ def set_search_config(keys: list[str]) -> dict[str, str]:
 def get_search_endpoint(config: dict[str, str]) -> str:
     return f"https://{config.get('SEARCH_SERVICE_NAME')}.search.windows.net"
 
+def cached(key: tuple, build):
+   with cache_lock:
+      if key not in cache:
+         cache[key] = build()
+
+      return cache[key]
+
+def service_key(config: dict[str, str]) -> tuple:
+   return tuple(config.get(k, "") for k in ("SEARCH_SERVICE_NAME", "AZURE_SUBSCRIPTION_ID", "RESOURCE_GROUP_NAME"))
+
+def get_credential() -> DefaultAzureCredential:
+   # a single instance keeps its tokens, so the credential chain is probed once per process
+   return cached(("credential",), DefaultAzureCredential)
+
+def get_management_client(subscription_id: str) -> SearchManagementClient:
+   return cached(("management", subscription_id), lambda: SearchManagementClient(get_credential(), subscription_id))
+
+def read_key_cache() -> dict:
+   try:
+      return json.loads(Path(KEY_CACHE_PATH).read_text(encoding="utf-8"))
+   except (OSError, ValueError):
+      return {}
+
+def write_key_cache(entries: dict):
+   path = Path(KEY_CACHE_PATH)
+   path.parent.mkdir(parents=True, exist_ok=True)
+   tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+   try:
+      os.remove(tmp)
+   except FileNotFoundError:
+      pass
+
+   # created owner-only, so the key is never readable by anyone else, even briefly
+   with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w", encoding="utf-8") as f:
+      f.write(json.dumps(entries))
+
+   os.replace(tmp, path)
+
+def forget_search_admin_key(config: dict[str, str]):
+   """Drops a rejected admin key from the process and the key cache, so the next client or run fetches the current one."""
+   with cache_lock:
+      for kind in ("admin_key", "indexer_client", "index_client"):
+         cache.pop((kind,) + service_key(config), None)
+
+      if KEY_CACHE_PATH:
+         entries = read_key_cache()
+
+         if entries.pop("/".join(service_key(config)), None) is not None:
+            write_key_cache(entries)
+
+def key_rejected_hook(config: dict[str, str]):
+   # a rotated or revoked key answers 401/403 until the cache TTL would otherwise expire it
+   def hook(response):
+      if response.http_response.status_code in (401, 403):
+         forget_search_admin_key(config)
+
+   return hook
+
 def get_search_admin_key(config: dict[str, str]) -> str:
+   """
+   The service's primary admin key, fetched from the management plane at most once per process and, when
+   SEARCH_KEY_CACHE_PATH is set, at most once per SEARCH_KEY_CACHE_TTL seconds across runs.
+   """
+   def build() -> str:
+      name = "/".join(service_key(config))
+
+      if KEY_CACHE_PATH:
+         entry = read_key_cache().get(name)
+
+         if entry and entry["expires"] > time.time():
+            return entry["key"]
+
+      key = fetch_search_admin_key(config)
+
+      if KEY_CACHE_PATH:
+         entries = {k: v for k, v in read_key_cache().items() if v["expires"] > time.time()}
+         entries[name] = {"key": key, "expires": time.time() + KEY_CACHE_TTL}
+         write_key_cache(entries)
+
+      return key
+
+   return cached(("admin_key",) + service_key(config), build)
+
+def fetch_search_admin_key(config: dict[str, str]) -> str:
     search_service_name, subscription_id, resource_group_name = (
       config[k] for k in ("SEARCH_SERVICE_NAME", "AZURE_SUBSCRIPTION_ID", "RESOURCE_GROUP_NAME")
    )
         
     try:
-        search_mgmt_client = SearchManagementClient(DefaultAzureCredential(), subscription_id)
+        search_mgmt_client = get_management_client(subscription_id)
         admin_keys = search_mgmt_client.admin_keys.get(resource_group_name, search_service_name)
 
         if not admin_keys or not admin_keys.primary_key:
@@ -52,7 +150,58 @@ def get_search_admin_key(config: dict[str, str]) -> str:
         raise Exception(f"Failed to get search service admin keys: {str(e)}")
     
 def get_search_indexer_client(config: dict[str, str]):   
-   return SearchIndexerClient(endpoint=get_search_endpoint(config), credential=AzureKeyCredential(get_search_admin_key(config)))
+   return cached(("indexer_client",) + service_key(config), lambda: SearchIndexerClient(endpoint=get_search_endpoint(config), credential=AzureKeyCredential(get_search_admin_key(config)), raw_response_hook=key_rejected_hook(config)))
 
 def get_search_index_client(config: dict[str, str]):
-   return SearchIndexClient(endpoint=get_search_endpoint(config), credential=AzureKeyCredential(get_search_admin_key(config)))
\ No newline at end of file
+   return cached(("index_client",) + service_key(config), lambda: SearchIndexClient(endpoint=get_search_endpoint(config), credential=AzureKeyCredential(get_search_admin_key(config)), raw_response_hook=key_rejected_hook(config)))
+
+def rest_body(definition, extra: dict) -> dict:
+   """
+   The REST JSON of `definition` with `extra` merged into it.  Serialized from the generated REST model, whose
+   layout is the wire schema (the public models differ, e.g. a datasource's connection string sits under
+   `credentials`).
+   """
+   body = definition._to_generated().serialize()
+   body.update(extra)
+   return body
+
+def put_definition(config: dict[str, str], collection: str, definition, extra: dict, api_version: str = GA_API_VERSION):
+   """
+   Creates or updates `definition` through the REST API with `extra` properties merged into it, for settings
+   the pinned SDK models drop (e.g. the indexer cache or native blob soft-delete detection).
+   """
+   import requests
+
+   response = requests.put(
+      f"{get_search_endpoint(config)}/{collection}('{definition.name}')",
+      params={"api-version": api_version},
+      headers={"api-key": get_search_admin_key(config), "Content-Type": "application/json"},
+      json=rest_body(definition, extra),
+      timeout=60)
+
+   if response.status_code in (401, 403):
+      forget_search_admin_key(config)
+
+   if not response.ok:
+      raise HttpResponseError(message=f"{response.status_code} {response.reason}: {response.text}")
+
+def get_definition(config: dict[str, str], collection: str, name: str, api_version: str = GA_API_VERSION) -> dict:
+   """The service's REST JSON for a definition, including the properties the SDK models drop."""
+   import requests
+
+   response = requests.get(
+      f"{get_search_endpoint(config)}/{collection}('{name}')",
+      params={"api-version": api_version},
+      headers={"api-key": get_search_admin_key(config)},
+      timeout=60)
+
+   if response.status_code in (401, 403):
+      forget_search_admin_key(config)
+
+   if response.status_code == 404:
+      raise ResourceNotFoundError(message=f"{collection}('{name}') not found")
+
+   if not response.ok:
+      raise HttpResponseError(message=f"{response.status_code} {response.reason}: {response.text}")
+
+   return response.json()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the scripts import each other by bare name, as when they are run from this directory
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
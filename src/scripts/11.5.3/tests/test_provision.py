@@ -0,0 +1,76 @@
+import pytest
+import create_search_indexer as indexer
+import provision
+from provision import Step, create, matches, secrets, serialized
+
+def test_properties_the_definition_leaves_unset_are_ignored():
+   assert matches({"name": "idx", "schedule": None}, {"name": "idx", "schedule": {"interval": "PT5M"}, "@odata.etag": "1"})
+
+def test_a_changed_property_does_not_match():
+   assert not matches({"name": "idx", "parameters": {"batchSize": 10}}, {"name": "idx", "parameters": {"batchSize": 20}})
+   assert not matches({"parameters": {"batchSize": 10}}, {"parameters": None})
+
+def test_lists_must_match_item_for_item():
+   desired = {"fieldMappings": [{"sourceFieldName": "a"}, {"sourceFieldName": "b"}]}
+
+   assert matches(desired, {"fieldMappings": [{"sourceFieldName": "a", "mappingFunction": None}, {"sourceFieldName": "b"}]})
+   assert not matches(desired, {"fieldMappings": [{"sourceFieldName": "a"}]})
+   assert not matches(desired, {"fieldMappings": [{"sourceFieldName": "b"}, {"sourceFieldName": "a"}]})
+
+def test_write_only_secrets_are_not_compared():
+   assert matches({"credentials": {"connectionString": "secret"}, "cache": {"storageConnectionString": "secret"}}, {"credentials": {"connectionString": None}, "cache": {}})
+
+@pytest.fixture
+def step(monkeypatch) -> Step:
+   for key, value in {"INDEXER_NAME": "idx", "DATASOURCE_NAME": "ds", "SKILLSET_NAME": "ss", "INDEX_NAME": "index"}.items():
+      monkeypatch.setitem(indexer.config, key, value)
+
+   existing = indexer.create_indexer_definition()
+   return Step("indexer", [], indexer.create_indexer_definition, lambda name: existing, None, None, rest=indexer)
+
+def test_definitions_without_rest_only_settings_compare_as_sdk_models(step, monkeypatch):
+   monkeypatch.setitem(indexer.config, "ENRICHMENT_CACHE_STORAGE", "")
+   desired, existing = serialized(step, step.definition())
+
+   assert desired["name"] == "idx" and matches(desired, existing)
+
+def test_rest_only_settings_are_compared(step, monkeypatch):
+   monkeypatch.setitem(indexer.config, "ENRICHMENT_CACHE_STORAGE", "DefaultEndpointsProtocol=https;AccountName=cache")
+   monkeypatch.setitem(indexer.config, "ENRICHMENT_CACHE_REPROCESSING", "true")
+   stored = {}
+   monkeypatch.setattr(provision, "get_definition", lambda config, collection, name, api_version: stored.get((collection, name, api_version)))
+
+   definition = step.definition()
+   desired, _ = serialized(step, definition)
+   assert desired["cache"] == {"storageConnectionString": "DefaultEndpointsProtocol=https;AccountName=cache", "enableReprocessing": True}
+
+   # what the service returns for the same indexer: the connection string is never read back
+   stored[("indexers", "idx", indexer.REST_API_VERSION)] = {**desired, "cache": {"storageConnectionString": None, "enableReprocessing": True}}
+   assert matches(*serialized(step, definition))
+
+   # the SDK model has no cache property, so only the REST comparison sees this change
+   stored[("indexers", "idx", indexer.REST_API_VERSION)] = {**desired, "cache": None}
+   assert not matches(*serialized(step, definition))
+
+def test_secrets_are_found_wherever_they_are_set():
+   desired = {"credentials": {"connectionString": "secret"}, "skills": [{"apiKey": None}, {"apiKey": "key"}], "cache": {"storageConnectionString": "secret", "enableReprocessing": True}}
+
+   assert secrets(desired) == ["credentials", "skills.1.apiKey", "cache.storageConnectionString"]
+   assert secrets({"credentials": {"connectionString": None}, "skills": [{"apiKey": None}]}) == []
+
+def fake_step(desired: dict, existing: dict, sent: list) -> Step:
+   definition = type("Definition", (), {"name": "ds", "serialize": lambda self: desired})()
+   existing_definition = type("Definition", (), {"serialize": lambda self: existing})()
+   return Step("datasource", [], lambda: definition, lambda name: existing_definition, sent.append, None)
+
+def test_unchanged_definitions_without_secrets_are_not_sent():
+   sent = []
+   assert create(fake_step({"name": "ds"}, {"name": "ds"}, sent), force=False) == ("unchanged", "")
+   assert sent == []
+
+def test_definitions_with_secrets_are_always_sent_and_say_why():
+   sent = []
+   step = fake_step({"name": "ds", "credentials": {"connectionString": "rotated"}}, {"name": "ds", "credentials": {"connectionString": None}}, sent)
+
+   assert create(step, force=False) == ("updated", "sent for its write-only credentials")
+   assert len(sent) == 1